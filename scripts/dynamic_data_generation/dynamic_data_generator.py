@@ -5,18 +5,42 @@ Generates fresh CSV data for token analytics evaluation using ONLY real CoinGeck
 """
 
 import pandas as pd
+import numpy as np
 import requests
 import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import time
+import asyncio
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+def _loads(raw: bytes):
+    """Decode a CoinGecko JSON body, with orjson when it is installed"""
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 class DynamicDataGenerator:
     """Generates dynamic CSV data for token analytics using ONLY real data"""
     
     def __init__(self, output_dir: str = 'data'):
         self.output_dir = output_dir
+        # Raw API payloads keyed by (token_id, days, date); a closed day's data never changes
+        self.cache_dir = os.path.join(output_dir, '.coingecko_cache')
         # Updated token list to include all tokens needed for the new queries
         self.tokens = [
             'ethereum',      # ETH
@@ -41,13 +65,8 @@ class DynamicDataGenerator:
         ]
         self.token_symbols = ['ETH', 'SOL', 'TAO', 'BTC', 'ADA', 'AVAX', 'MATIC', 'UNI', 'DOGE', 'BNB', 'DOT', 'PEPE', 'FARTCOIN', 'SHIB', 'GRT', 'RTL', 'MODO', 'OP', 'XRP']
         
-    def fetch_coingecko_data(self, token_id: str, days: int = 30) -> Optional[pd.DataFrame]:
-        """Fetch ONLY real data from CoinGecko API - no estimation"""
-        max_retries = 3
-        retry_delay = 2  # seconds
-        
-        # Load API key
-        import os
+    def _api_headers(self) -> Dict[str, str]:
+        """Load the CoinGecko API key and build the request headers"""
         from dotenv import load_dotenv
         load_dotenv()
         api_key = os.getenv('COINGECKO_API_KEY')
@@ -57,24 +76,100 @@ class DynamicDataGenerator:
         else:
             quit("No CoinGecko API key found")
         
+        # CoinGecko API key goes in headers, not params
+        return {'x-cg-demo-api-key': api_key}
+    
+    def _cache_path(self, token_id: str, days: int) -> str:
+        """Cache file for one token/days request made today"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        return os.path.join(self.cache_dir, f"{token_id}_{days}_{today}.json")
+    
+    def _load_cached_frame(self, token_id: str, days: int) -> Optional[pd.DataFrame]:
+        """Return today's cached CoinGecko data for this request as a frame, if any"""
+        cache_path = self._cache_path(token_id, days)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, 'rb') as f:
+                print(f"📦 Using cached CoinGecko data for {token_id}")
+                return self._build_frame(token_id, _loads(f.read()))
+        except Exception as e:
+            # Truncated or unexpected payload: drop it and fetch fresh data instead
+            print(f"⚠️  Discarding unusable cache for {token_id}: {e}")
+            os.remove(cache_path)
+            return None
+    
+    def _store_payload(self, token_id: str, days: int, raw: bytes):
+        """Persist a raw CoinGecko response body so repeat runs today skip the HTTP call"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._cache_path(token_id, days), 'wb') as f:
+            f.write(raw)
+    
+    def _build_frame(self, token_id: str, data: Dict) -> pd.DataFrame:
+        """Turn a CoinGecko market_chart payload into a daily OHLCV DataFrame"""
+        # Extract ONLY real data from CoinGecko
+        prices = data['prices']
+        volumes = data['total_volumes']
+        
+        print(f"✅ Received {len(prices)} REAL price points and {len(volumes)} REAL volume points")
+        
+        # Pull both series into float arrays once; volumes pair with prices by position
+        price_arr = np.asarray(prices, dtype=np.float64).reshape(-1, 2)
+        volume_arr = np.asarray(volumes, dtype=np.float64).reshape(-1, 2)
+        n = min(len(price_arr), len(volume_arr))
+        close = price_arr[:n, 1]
+        volume = volume_arr[:n, 1]
+        
+        # Clean up - only keep real data
+        keep = ~(np.isnan(close) | np.isnan(volume))
+        close = close[keep]
+        
+        # For CoinGecko daily data, we only have close prices and volumes
+        # We'll use close price as open/high/low since we don't have intraday data
+        df = pd.DataFrame({
+            'date': pd.to_datetime(price_arr[:n, 0][keep].astype(np.int64), unit='ms'),
+            'open': close,
+            'high': close,
+            'low': close,
+            'close': close,
+            'volume': volume[keep]
+        })
+        
+        print(f"✅ Successfully processed REAL data for {token_id}")
+        print(f"   Date range: {df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}")
+        print(f"   Price range: ${df['close'].min():.2f} - ${df['close'].max():.2f}")
+        print(f"   Volume range: {df['volume'].min():.0f} - {df['volume'].max():.0f}")
+        
+        return df
+    
+    def fetch_coingecko_data(self, token_id: str, days: int = 30,
+                             session: Optional[requests.Session] = None) -> Optional[pd.DataFrame]:
+        """Fetch ONLY real data from CoinGecko API - no estimation
+        
+        Pass a shared requests.Session to keep one connection alive across tokens.
+        """
+        max_retries = 3
+        retry_delay = 2  # seconds
+        
+        cached = self._load_cached_frame(token_id, days)
+        if cached is not None:
+            return cached
+        
+        headers = self._api_headers()
+        http = session or requests
+        
         for attempt in range(max_retries):
             try:
                 print(f"🔗 Fetching REAL data from CoinGecko for {token_id}... (attempt {attempt + 1}/{max_retries})")
                 url = f"https://api.coingecko.com/api/v3/coins/{token_id}/market_chart"
                 
-                # CoinGecko API key goes in headers, not params
-                headers = {}
-                if api_key:
-                    headers['x-cg-demo-api-key'] = api_key
-                    print(f"🔑 Added API key to headers")
-                
                 params = {
                     'vs_currency': 'usd',
                     'days': days,
                     'interval': 'daily'
                 }
                 
-                response = requests.get(url, params=params, headers=headers, timeout=30)
+                response = http.get(url, params=params, headers=headers, timeout=30)
                 
                 if response.status_code == 429:  # Rate limit
                     print(f"⚠️  Rate limit hit for {token_id}, waiting {retry_delay}s...")
@@ -84,37 +179,9 @@ class DynamicDataGenerator:
                     
                 response.raise_for_status()
                 
-                data = response.json()
-                
-                # Extract ONLY real data from CoinGecko
-                prices = data['prices']
-                volumes = data['total_volumes']
-                
-                print(f"✅ Received {len(prices)} REAL price points and {len(volumes)} REAL volume points")
-                
-                # Convert to DataFrame with ONLY real data
-                df = pd.DataFrame(prices, columns=['timestamp', 'close'])
-                df['date'] = pd.to_datetime(df['timestamp'], unit='ms')
-                
-                # Add ONLY real volume data
-                volume_df = pd.DataFrame(volumes, columns=['timestamp', 'volume'])
-                df['volume'] = volume_df['volume']
-                
-                # For CoinGecko daily data, we only have close prices and volumes
-                # We'll use close price as the primary price and set open/high/low to close
-                df['open'] = df['close']  # Use close as open since we don't have intraday data
-                df['high'] = df['close']  # Use close as high since we don't have intraday data  
-                df['low'] = df['close']   # Use close as low since we don't have intraday data
-                
-                # Clean up - only keep real data
-                df = df.dropna()
-                df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
-                
-                print(f"✅ Successfully processed REAL data for {token_id}")
-                print(f"   Date range: {df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}")
-                print(f"   Price range: ${df['close'].min():.2f} - ${df['close'].max():.2f}")
-                print(f"   Volume range: {df['volume'].min():.0f} - {df['volume'].max():.0f}")
-                
+                df = self._build_frame(token_id, _loads(response.content))
+                # Cache only payloads that produced a frame
+                self._store_payload(token_id, days, response.content)
                 return df
                 
             except requests.exceptions.HTTPError as e:
@@ -133,7 +200,58 @@ class DynamicDataGenerator:
         print(f"❌ Failed to fetch data for {token_id} after {max_retries} attempts")
         return None
     
-
+    async def fetch_coingecko_data_async(self, client, semaphore: asyncio.Semaphore,
+                                         headers: Dict[str, str], token_id: str,
+                                         days: int = 30) -> Optional[pd.DataFrame]:
+        """Async variant of fetch_coingecko_data; concurrency is bounded by the shared semaphore"""
+        max_retries = 3
+        retry_delay = 2  # seconds
+        url = f"https://api.coingecko.com/api/v3/coins/{token_id}/market_chart"
+        params = {
+            'vs_currency': 'usd',
+            'days': days,
+            'interval': 'daily'
+        }
+        
+        cached = self._load_cached_frame(token_id, days)
+        if cached is not None:
+            return cached
+        
+        async with semaphore:
+            for attempt in range(max_retries):
+                try:
+                    print(f"🔗 Fetching REAL data from CoinGecko for {token_id}... (attempt {attempt + 1}/{max_retries})")
+                    response = await client.get(url, params=params, headers=headers)
+                    
+                    if response.status_code == 429:  # Rate limit - back off only when asked to
+                        print(f"⚠️  Rate limit hit for {token_id}, waiting {retry_delay}s...")
+                        await asyncio.sleep(retry_delay)
+                        retry_delay *= 2  # Exponential backoff
+                        continue
+                    
+                    response.raise_for_status()
+                    
+                    df = self._build_frame(token_id, _loads(response.content))
+                    # Cache only payloads that produced a frame
+                    self._store_payload(token_id, days, response.content)
+                    return df
+                    
+                except Exception as e:
+                    print(f"❌ Error fetching data for {token_id}: {e}")
+                    return None
+        
+        print(f"❌ Failed to fetch data for {token_id} after {max_retries} attempts")
+        return None
+    
+    async def _fetch_all_async(self, days: int) -> List[Optional[pd.DataFrame]]:
+        """Fetch every token concurrently over one HTTP client"""
+        headers = self._api_headers()
+        semaphore = asyncio.Semaphore(3)  # Stay well inside CoinGecko's per-minute cap
+        async with httpx.AsyncClient(timeout=30) as client:
+            return await asyncio.gather(*[
+                self.fetch_coingecko_data_async(client, semaphore, headers, token_id, days)
+                for token_id in self.tokens
+            ])
     
     def generate_data(self, days: int = 30) -> Dict[str, pd.DataFrame]:
         """Generate data for all tokens using ONLY real CoinGecko data"""
@@ -142,18 +260,33 @@ class DynamicDataGenerator:
         
         data = {}
         
+        if httpx is not None:
+            frames = asyncio.run(self._fetch_all_async(days))
+            for symbol, df in zip(self.token_symbols, frames):
+                if df is None:
+                    print(f"❌ Failed to fetch data for {symbol} from CoinGecko API")
+                    continue
+                data[symbol] = df
+                print(f"✅ Generated {len(df)} days of REAL data for {symbol}")
+            return data
+        
+        # One keep-alive connection for every sequential request
+        session = requests.Session()
         for token_id, symbol in zip(self.tokens, self.token_symbols):
             print(f"\n📊 Processing {symbol} ({token_id})...")
             
-            df = self.fetch_coingecko_data(token_id, days)
+            df = self._load_cached_frame(token_id, days)
+            from_cache = df is not None
+            if df is None:
+                df = self.fetch_coingecko_data(token_id, days, session=session)
             if df is None:
                 print(f"❌ Failed to fetch data for {symbol} from CoinGecko API")
                 continue
             else:
                 print(f"✅ Using ONLY REAL CoinGecko data for {symbol}")
             
-            # Add delay between API calls to prevent rate limiting
-            if symbol != self.token_symbols[-1]:  # Not the last token
+            # Add delay between API calls to prevent rate limiting; cache hits made no call
+            if not from_cache and symbol != self.token_symbols[-1]:  # Not the last token
                 print(f"⏳ Waiting 3 seconds before next API call...")
                 time.sleep(3)
             
@@ -162,6 +295,7 @@ class DynamicDataGenerator:
                 print(f"✅ Generated {len(df)} days of REAL data for {symbol}")
             else:
                 print(f"❌ Failed to generate data for {symbol}")
+        session.close()
         
         return data
     
@@ -173,8 +307,25 @@ class DynamicDataGenerator:
             filename = f"{symbol.lower()}_daily.csv"
             filepath = os.path.join(self.output_dir, filename)
             
-            df.to_csv(filepath, index=False)
+            if pa is not None:
+                # Arrow's C++ writer; truncate dates to whole seconds so they print as YYYY-MM-DD HH:MM:SS
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                date_idx = table.schema.get_field_index('date')
+                table = table.set_column(date_idx, 'date', table.column('date').cast(pa.timestamp('s'), safe=False))
+                pacsv.write_csv(table, filepath)
+            else:
+                df.to_csv(filepath, index=False)
             print(f"💾 Saved {filename} ({len(df)} rows of REAL data)")
+            self.save_parquet_file(symbol, df)
+    
+    def save_parquet_file(self, symbol: str, df: pd.DataFrame):
+        """Save a date-indexed Parquet copy next to the CSV for faster downstream reads"""
+        filepath = os.path.join(self.output_dir, f"{symbol.lower()}_daily.parquet")
+        try:
+            # Written after the CSV so readers see it as up to date
+            df.set_index('date').to_parquet(filepath, compression='zstd')
+        except ImportError:
+            pass  # No Parquet engine installed; the CSV is the only copy
     
     def update_metadata(self, data: Dict[str, pd.DataFrame]):
         """Update metadata about the generated data"""
@@ -9,39 +9,230 @@ import numpy as np
 import yaml
 import os
 from datetime import datetime
-from typing import Dict, List, Any, Union
+from functools import lru_cache
+from typing import Dict, List, Any, Union, Tuple
 import json
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+class _Dumper(SafeDumper):
+    """Safe dumper that emits NumPy values and pandas Timestamps as plain YAML, without touching SafeDumper itself"""
+
+_Dumper.add_multi_representer(np.generic, lambda dumper, value: dumper.represent_data(value.item()))
+_Dumper.add_representer(np.ndarray, lambda dumper, value: dumper.represent_list(value.tolist()))
+_Dumper.add_representer(pd.Timestamp, lambda dumper, value: dumper.represent_str(value.isoformat()))
+
+def _longest_true_run(mask: np.ndarray) -> int:
+    """Length of the longest run of True values, via run-length edges"""
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return int((ends - starts).max(initial=0))
+
+def _rolling_pct_extremum(close: np.ndarray, window: int, find_max: bool) -> Tuple[int, float]:
+    """Position and value of the largest (or smallest) window-day % change in one pass"""
+    returns = (close[window:] / close[:-window] - 1.0) * 100
+    i = returns.argmax() if find_max else returns.argmin()
+    return i + window, returns[i]
+
+if njit is not None:
+    _rolling_pct_extremum = njit(cache=True)(_rolling_pct_extremum)
+
+def _data_signature(data_dir: str) -> Tuple[Tuple[str, float], ...]:
+    """(filename, mtime) of each daily CSV, so regenerated data invalidates the cache"""
+    return tuple(
+        (filename, os.path.getmtime(os.path.join(data_dir, filename)))
+        for filename in os.listdir(data_dir)
+        if filename.endswith('_daily.csv')
+    )
+
+# Explicit column types so the C parser skips per-column type inference
+_DAILY_DTYPES = {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64', 'volume': 'float64'}
+
+def read_daily_csv(filepath: str) -> pd.DataFrame:
+    """Read a daily CSV, preferring the up-to-date Parquet copy the generator writes next to it"""
+    parquet_path = filepath[:-len('.csv')] + '.parquet'
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(filepath):
+        try:
+            return pd.read_parquet(parquet_path)
+        except Exception:
+            pass  # No Parquet engine, or a corrupt/half-written copy; the CSV is authoritative
+    return pd.read_csv(filepath, parse_dates=['date'], index_col='date', dtype=_DAILY_DTYPES)
+
+@lru_cache(maxsize=1)
+def _load_data_cached(data_dir: str, signature: Tuple[Tuple[str, float], ...]) -> Tuple[Tuple[str, pd.DataFrame], ...]:
+    """Load and index every daily CSV once per data snapshot"""
+    loaded = []
+    for filename, _ in signature:
+        symbol = filename.split('_')[0].upper()
+        filepath = os.path.join(data_dir, filename)
+        
+        try:
+            df = read_daily_csv(filepath)
+            
+            # Calculate daily returns
+            df['daily_return'] = df['close'].pct_change() * 100
+            
+            loaded.append((symbol, df))
+            
+        except Exception as e:
+            print(f"❌ Error loading {filename}: {e}")
+    return tuple(loaded)
+
+def _token_from_id(query_id: str) -> str:
+    """Token symbol embedded as the second underscore-separated part of a query id"""
+    return query_id.split('_')[1].upper()
+
+# Static query-id -> calculation mapping, per category: (id fragment, handler(calculator, query_id))
+_TRUTH_DISPATCH = {
+    'basic_price': (
+        ('current_price', lambda calc, qid: calc.calculate_basic_price(_token_from_id(qid), 'current_price')),
+    ),
+    'basic_extremes': (
+        ('highest_price', lambda calc, qid: calc.calculate_basic_price(_token_from_id(qid), 'highest_price')),
+        ('lowest_price', lambda calc, qid: calc.calculate_basic_price(_token_from_id(qid), 'lowest_price')),
+    ),
+    'basic_return': (
+        ('total_return', lambda calc, qid: calc.calculate_basic_price(_token_from_id(qid), 'total_return')),
+    ),
+    'basic_counting': (
+        ('green_days', lambda calc, qid: calc.calculate_green_days(_token_from_id(qid))),
+    ),
+    'basic_ranking': (
+        ('rank_by_return', lambda calc, qid: calc.calculate_ranking('return')),
+        ('rank_by_volume', lambda calc, qid: calc.calculate_ranking('volume')),
+        ('rank_by_volatility', lambda calc, qid: calc.calculate_ranking('volatility')),
+    ),
+    'percentage_threshold': (
+        ('pct_tao_above_420', lambda calc, qid: calc.calculate_percentage_threshold('TAO', 420, above=True)),
+        ('pct_sol_below_140', lambda calc, qid: calc.calculate_percentage_threshold('SOL', 140, above=False)),
+    ),
+    'conditional_threshold': (
+        ('both_sol_eth_green', lambda calc, qid: calc.calculate_conditional_threshold('both_sol_eth_green')),
+        ('sol_up_eth_down', lambda calc, qid: calc.calculate_conditional_threshold('sol_up_eth_down')),
+        ('pct_sol_above_160_when_eth_above_2700',
+         lambda calc, qid: calc.calculate_conditional_threshold('sol_above_160_when_eth_above_2700')),
+    ),
+    'price_change': (
+        ('sol_price_change_first_half', lambda calc, qid: calc.calculate_price_change('SOL', 'first_half')),
+        ('eth_price_change_second_half', lambda calc, qid: calc.calculate_price_change('ETH', 'second_half')),
+    ),
+    'rolling_stats': (
+        ('tao_max_5d_rolling_return', lambda calc, qid: calc.calculate_rolling_stats('TAO', 'max_5d_rolling_return')),
+        ('sol_min_3d_rolling_return', lambda calc, qid: calc.calculate_rolling_stats('SOL', 'min_3d_rolling_return')),
+        ('tao_biggest_weekly_gain', lambda calc, qid: calc.calculate_rolling_stats('TAO', 'biggest_weekly_gain')),
+        ('pct_sol_close_above_7dma', lambda calc, qid: calc.calculate_rolling_stats('SOL', 'pct_close_above_7dma')),
+    ),
+    'streak_analysis': (
+        ('sol_longest_streak_above_155',
+         lambda calc, qid: calc.calculate_streak_analysis('SOL', 'longest_streak_above_155')),
+        ('eth_longest_consecutive_red_days',
+         lambda calc, qid: calc.calculate_streak_analysis('ETH', 'longest_consecutive_red_days')),
+    ),
+    'volatility': (
+        ('tao_highest_daily_change_date',
+         lambda calc, qid: calc.calculate_volatility_stats('TAO', 'highest_daily_change_date')),
+        ('tao_highest_intraday_swing_date',
+         lambda calc, qid: calc.calculate_volatility_stats('TAO', 'highest_intraday_swing_date')),
+        ('eth_days_change_gt5pct', lambda calc, qid: calc.calculate_volatility_stats('ETH', 'days_change_gt5pct')),
+        ('eth_days_range_gt5pct', lambda calc, qid: calc.calculate_volatility_stats('ETH', 'days_range_gt5pct')),
+        ('eth_biggest_single_day_loss',
+         lambda calc, qid: calc.calculate_volatility_stats('ETH', 'biggest_single_day_loss')),
+    ),
+    'volatility_stat': (
+        ('eth_stddev_daily_return', lambda calc, qid: calc.calculate_volatility_stats('ETH', 'stddev_daily_return')),
+        ('tao_avg_daily_change', lambda calc, qid: calc.calculate_volatility_stats('TAO', 'avg_daily_change')),
+    ),
+    'volume_analysis': (
+        ('sol_highest_volume_zscore_day',
+         lambda calc, qid: calc.calculate_volume_analysis('SOL', 'highest_volume_zscore_day')),
+        ('pct_days_tao_vol_gt_2x_avg', lambda calc, qid: calc.calculate_volume_analysis('TAO', 'pct_days_vol_gt_2x_avg')),
+    ),
+    'conditional_volume': (
+        ('eth_avg_volume_when_sol_drop_gt5',
+         lambda calc, qid: calc.calculate_conditional_volume('eth_avg_volume_when_sol_drop_gt5')),
+    ),
+    'performance_comparison': (
+        ('rank_by_max_daily_change', lambda calc, qid: calc.calculate_ranking('max_daily_change')),
+        # Simplified Sharpe ratio calculation
+        ('rank_by_sharpe', lambda calc, qid: calc._rank_by('sharpe')),
+        ('rank_by_total_return', lambda calc, qid: calc.calculate_ranking('return')),
+        ('rank_by_volatility', lambda calc, qid: calc.calculate_ranking('volatility')),
+    ),
+}
+
 class DynamicTruthCalculator:
     """Calculates truth values dynamically from CSV data"""
     
     def __init__(self, data_dir: str = 'data'):
         self.data_dir = data_dir
         self.data = {}
+        self._summary = None
+        self._array_cache = {}
         self.load_data()
     
     def load_data(self):
         """Load all CSV data files"""
         print("📊 Loading CSV data...")
         
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('_daily.csv'):
-                symbol = filename.split('_')[0].upper()
-                filepath = os.path.join(self.data_dir, filename)
-                
-                try:
-                    df = pd.read_csv(filepath)
-                    df['date'] = pd.to_datetime(df['date'])
-                    df.set_index('date', inplace=True)
-                    
-                    # Calculate daily returns
-                    df['daily_return'] = df['close'].pct_change() * 100
-                    
-                    self.data[symbol] = df
-                    print(f"✅ Loaded {symbol}: {len(df)} days")
-                    
-                except Exception as e:
-                    print(f"❌ Error loading {filename}: {e}")
+        for symbol, df in _load_data_cached(self.data_dir, _data_signature(self.data_dir)):
+            # Shallow copy so columns added by calculations don't leak into the shared cache
+            self.data[symbol] = df.copy(deep=False)
+            print(f"✅ Loaded {symbol}: {len(df)} days")
+    
+    def _arrays(self, token: str) -> Dict[str, np.ndarray]:
+        """Contiguous float64 column arrays for a token, extracted once and reused by the NumPy kernels"""
+        arrays = self._array_cache.get(token)
+        if arrays is None:
+            df = self.data[token]
+            arrays = {
+                column: np.ascontiguousarray(df[column].to_numpy(np.float64))
+                for column in ('open', 'high', 'low', 'close', 'volume', 'daily_return')
+            }
+            self._array_cache[token] = arrays
+        return arrays
+    
+    def token_summary(self) -> pd.DataFrame:
+        """Per-token reductions shared by the ranking queries, computed once per instance"""
+        if self._summary is None:
+            # Stack all tokens into one long frame and reduce everything in a single groupby
+            long = pd.concat(
+                [df[['close', 'high', 'low', 'volume', 'daily_return']].assign(symbol=token)
+                 for token, df in self.data.items()],
+                ignore_index=True
+            )
+            long['abs_return'] = long['daily_return'].abs()
+            summary = long.groupby('symbol', sort=False).agg(
+                first_close=('close', 'first'),
+                last_close=('close', 'last'),
+                avg_close=('close', 'mean'),
+                max_high=('high', 'max'),
+                min_low=('low', 'min'),
+                avg_volume=('volume', 'mean'),
+                mean_return=('daily_return', 'mean'),
+                std_return=('daily_return', 'std'),
+                max_abs_return=('abs_return', 'max'),
+            )
+            summary['total_return'] = (summary['last_close'] - summary['first_close']) / summary['first_close'] * 100
+            summary['volatility'] = (summary['max_high'] - summary['min_low']) / summary['avg_close'] * 100
+            summary['sharpe'] = np.where(summary['std_return'] > 0, summary['mean_return'] / summary['std_return'], 0)
+            self._summary = summary
+        return self._summary
+    
+    def _rank_by(self, column: str) -> List[str]:
+        """Tokens ordered by a token_summary column (highest first)"""
+        values = self.token_summary()[column]
+        order = np.argsort(-values.to_numpy(), kind='stable')
+        return values.index[order].tolist()
     
     def calculate_basic_price(self, token: str, metric: str) -> Union[float, str]:
         """Calculate basic price metrics"""
@@ -57,8 +248,7 @@ class DynamicTruthCalculator:
         elif metric == 'lowest_price':
             return float(df['low'].min())
         elif metric == 'total_return':
-            start_price = df['close'].iloc[0]
-            end_price = df['close'].iloc[-1]
+            start_price, end_price = self._arrays(token)['close'].take([0, -1])
             return ((end_price - start_price) / start_price) * 100
         
         return None
@@ -74,48 +264,15 @@ class DynamicTruthCalculator:
     
     def calculate_ranking(self, metric: str) -> List[str]:
         """Calculate rankings for various metrics"""
-        rankings = []
-        
-        if metric == 'return':
-            returns = {}
-            for token in self.data:
-                returns[token] = self.calculate_basic_price(token, 'total_return')
-            
-            # Sort by return (highest first)
-            sorted_tokens = sorted(returns.items(), key=lambda x: x[1], reverse=True)
-            return [token for token, _ in sorted_tokens]
-        
-        elif metric == 'volume':
-            volumes = {}
-            for token in self.data:
-                volumes[token] = self.data[token]['volume'].mean()
-            
-            # Sort by volume (highest first)
-            sorted_tokens = sorted(volumes.items(), key=lambda x: x[1], reverse=True)
-            return [token for token, _ in sorted_tokens]
-        
-        elif metric == 'volatility':
-            volatilities = {}
-            for token in self.data:
-                df = self.data[token]
-                price_range = (df['high'].max() - df['low'].min()) / df['close'].mean() * 100
-                volatilities[token] = price_range
-            
-            # Sort by volatility (highest first)
-            sorted_tokens = sorted(volatilities.items(), key=lambda x: x[1], reverse=True)
-            return [token for token, _ in sorted_tokens]
-        
-        elif metric == 'max_daily_change':
-            max_changes = {}
-            for token in self.data:
-                df = self.data[token]
-                max_changes[token] = df['daily_return'].abs().max()
-            
-            # Sort by max change (highest first)
-            sorted_tokens = sorted(max_changes.items(), key=lambda x: x[1], reverse=True)
-            return [token for token, _ in sorted_tokens]
-        
-        return []
+        column = {
+            'return': 'total_return',
+            'volume': 'avg_volume',
+            'volatility': 'volatility',
+            'max_daily_change': 'max_abs_return',
+        }.get(metric)
+        if column is None:
+            return []
+        return self._rank_by(column)
     
     def calculate_percentage_threshold(self, token: str, threshold: float, above: bool = True) -> float:
         """Calculate percentage of days above/below threshold"""
@@ -141,9 +298,9 @@ class DynamicTruthCalculator:
             if sol_df is None or eth_df is None:
                 return 0.0
             
-            # Calculate daily changes
-            sol_changes = sol_df['close'].pct_change() > 0
-            eth_changes = eth_df['close'].pct_change() > 0
+            # Daily changes, reusing the returns computed at load time
+            sol_changes = sol_df['daily_return'] > 0
+            eth_changes = eth_df['daily_return'] > 0
             
             # Both green on same day
             both_green = (sol_changes & eth_changes).sum()
@@ -158,9 +315,9 @@ class DynamicTruthCalculator:
             if sol_df is None or eth_df is None:
                 return 0.0
             
-            # Calculate daily changes
-            sol_changes = sol_df['close'].pct_change() > 0
-            eth_changes = eth_df['close'].pct_change() < 0
+            # Daily changes, reusing the returns computed at load time
+            sol_changes = sol_df['daily_return'] > 0
+            eth_changes = eth_df['daily_return'] < 0
             
             # SOL up and ETH down on same day
             sol_up_eth_down = (sol_changes & eth_changes).sum()
@@ -175,16 +332,20 @@ class DynamicTruthCalculator:
             if sol_df is None or eth_df is None:
                 return 0.0
             
+            if not sol_df.index.equals(eth_df.index):
+                sol_df = sol_df.reindex(eth_df.index)
+            
             # Days when ETH is above 2700
-            eth_above_2700 = eth_df['close'] > 2700
+            eth_above_2700 = eth_df['close'].to_numpy() > 2700
+            total = int(eth_above_2700.sum())
             
-            if eth_above_2700.sum() == 0:
+            if total == 0:
                 return 0.0  # No days with ETH above 2700
             
             # On those days, how many times was SOL above 160?
-            sol_above_160_on_eth_days = (sol_df['close'] > 160) & eth_above_2700
+            hits = int((sol_df['close'].to_numpy()[eth_above_2700] > 160).sum())
             
-            return (sol_above_160_on_eth_days.sum() / eth_above_2700.sum()) * 100
+            return (hits / total) * 100
         
         return 0.0
     
@@ -193,16 +354,13 @@ class DynamicTruthCalculator:
         if token not in self.data:
             return 0.0
         
-        df = self.data[token]
+        close = self._arrays(token)['close']
+        mid_point = len(close) // 2
         
         if period == 'first_half':
-            mid_point = len(df) // 2
-            start_price = df['close'].iloc[0]
-            end_price = df['close'].iloc[mid_point]
+            start_price, end_price = close.take([0, mid_point])
         elif period == 'second_half':
-            mid_point = len(df) // 2
-            start_price = df['close'].iloc[mid_point]
-            end_price = df['close'].iloc[-1]
+            start_price, end_price = close.take([mid_point, -1])
         else:
             return 0.0
         
@@ -216,29 +374,29 @@ class DynamicTruthCalculator:
         df = self.data[token]
         
         if metric == 'max_5d_rolling_return':
-            rolling_returns = df['close'].pct_change(5) * 100
-            return float(rolling_returns.max())
+            _, max_return = _rolling_pct_extremum(self._arrays(token)['close'], 5, True)
+            return float(max_return)
         
         elif metric == 'min_3d_rolling_return':
-            rolling_returns = df['close'].pct_change(3) * 100
-            return float(rolling_returns.min())
+            _, min_return = _rolling_pct_extremum(self._arrays(token)['close'], 3, False)
+            return float(min_return)
         
         elif metric == 'biggest_weekly_gain':
             # Find the week with biggest gain
-            weekly_returns = df['close'].pct_change(7) * 100
-            max_week_idx = weekly_returns.idxmax()
-            max_gain = weekly_returns.max()
+            i, max_gain = _rolling_pct_extremum(self._arrays(token)['close'], 7, True)
+            max_week_idx = df.index[int(i)]
             
             return f"Week of {max_week_idx.strftime('%Y-%m-%d')} : +{max_gain:.2f} %"
         
         elif metric == 'pct_close_above_7dma':
-            # Calculate 7-day moving average
-            df['7dma'] = df['close'].rolling(window=7).mean()
+            # Calculate 7-day moving average once as a plain array
+            close = self._arrays(token)['close']
+            ma_7d = df['close'].rolling(window=7).mean().to_numpy()
             
             # Count days where close is above 7dma (excluding first 6 days)
-            valid_days = df.dropna()
-            days_above_7dma = (valid_days['close'] > valid_days['7dma']).sum()
-            total_valid_days = len(valid_days)
+            valid = ~np.isnan(ma_7d)
+            days_above_7dma = int((close[valid] > ma_7d[valid]).sum())
+            total_valid_days = int(valid.sum())
             
             return (days_above_7dma / total_valid_days) * 100 if total_valid_days > 0 else 0.0
         
@@ -253,17 +411,11 @@ class DynamicTruthCalculator:
         
         if metric == 'longest_streak_above_155':
             # For SOL, find longest streak above $155
-            above_155 = df['close'] > 155
-            streaks = (above_155 != above_155.shift()).cumsum()
-            longest_streak = above_155.groupby(streaks).sum().max()
-            return int(longest_streak)
+            return _longest_true_run(self._arrays(token)['close'] > 155)
         
         elif metric == 'longest_consecutive_red_days':
             # Find longest streak of negative daily returns
-            red_days = df['daily_return'] < 0
-            streaks = (red_days != red_days.shift()).cumsum()
-            longest_streak = red_days.groupby(streaks).sum().max()
-            return int(longest_streak)
+            return _longest_true_run(self._arrays(token)['daily_return'] < 0)
         
         return None
     
@@ -292,14 +444,16 @@ class DynamicTruthCalculator:
         
         elif metric == 'highest_intraday_swing_date':
             # Calculate intraday swing as (high - low) / close * 100
-            df['intraday_swing'] = (df['high'] - df['low']) / df['close'] * 100
-            max_swing_idx = df['intraday_swing'].idxmax()
+            arrays = self._arrays(token)
+            swing = (arrays['high'] - arrays['low']) / arrays['close'] * 100
+            max_swing_idx = df.index[int(np.nanargmax(swing))]
             return max_swing_idx.strftime('%Y-%m-%d')
         
         elif metric == 'days_range_gt5pct':
             # Calculate intraday range as percentage of closing price
-            df['intraday_range'] = (df['high'] - df['low']) / df['close'] * 100
-            return int((df['intraday_range'] > 5).sum())
+            arrays = self._arrays(token)
+            intraday_range = (arrays['high'] - arrays['low']) / arrays['close'] * 100
+            return int((intraday_range > 5).sum())
         
         return None
     
@@ -312,10 +466,9 @@ class DynamicTruthCalculator:
         
         if metric == 'highest_volume_zscore_day':
             # Find day with highest volume z-score
-            volume_mean = df['volume'].mean()
-            volume_std = df['volume'].std()
-            z_scores = (df['volume'] - volume_mean) / volume_std
-            max_zscore_idx = z_scores.idxmax()
+            volume = self._arrays(token)['volume']
+            z_scores = (volume - volume.mean()) / volume.std(ddof=1)
+            max_zscore_idx = df.index[int(np.nanargmax(z_scores))]
             return max_zscore_idx.strftime('%Y-%m-%d')
         
         elif metric == 'pct_days_vol_gt_2x_avg':
@@ -335,14 +488,16 @@ class DynamicTruthCalculator:
                 return None
             
             # Find days when SOL dropped more than 5%
-            sol_drops_gt5 = sol_df['daily_return'] < -5
-            drop_dates = sol_df[sol_drops_gt5].index
+            sol_drops_gt5 = sol_df['daily_return'].to_numpy() < -5
             
-            if len(drop_dates) == 0:
+            if not sol_drops_gt5.any():
                 return None  # No days with SOL drops > 5%
             
-            # Get ETH volume on those specific dates
-            eth_volume_on_drop_days = eth_df.loc[drop_dates, 'volume']
+            # Get ETH volume on those specific dates; positional when both share the same dates
+            if sol_df.index.equals(eth_df.index):
+                eth_volume_on_drop_days = eth_df['volume'].to_numpy()[sol_drops_gt5]
+            else:
+                eth_volume_on_drop_days = eth_df.loc[sol_df.index[sol_drops_gt5], 'volume'].to_numpy()
             
             return float(eth_volume_on_drop_days.mean())
         
@@ -351,122 +506,11 @@ class DynamicTruthCalculator:
     def calculate_truth_for_query(self, query: Dict) -> Any:
         """Calculate truth value for a specific query"""
         query_id = query['id']
-        category = query['category']
-        
-        # Basic price queries
-        if category == 'basic_price':
-            if 'current_price' in query_id:
-                token = query_id.split('_')[1].upper()
-                return self.calculate_basic_price(token, 'current_price')
-        
-        elif category == 'basic_extremes':
-            if 'highest_price' in query_id:
-                token = query_id.split('_')[1].upper()
-                return self.calculate_basic_price(token, 'highest_price')
-            elif 'lowest_price' in query_id:
-                token = query_id.split('_')[1].upper()
-                return self.calculate_basic_price(token, 'lowest_price')
-        
-        elif category == 'basic_return':
-            if 'total_return' in query_id:
-                token = query_id.split('_')[1].upper()
-                return self.calculate_basic_price(token, 'total_return')
-        
-        elif category == 'basic_counting':
-            if 'green_days' in query_id:
-                token = query_id.split('_')[1].upper()
-                return self.calculate_green_days(token)
-        
-        elif category == 'basic_ranking':
-            if 'rank_by_return' in query_id:
-                return self.calculate_ranking('return')
-            elif 'rank_by_volume' in query_id:
-                return self.calculate_ranking('volume')
-            elif 'rank_by_volatility' in query_id:
-                return self.calculate_ranking('volatility')
-        
-        elif category == 'percentage_threshold':
-            if 'pct_tao_above_420' in query_id:
-                return self.calculate_percentage_threshold('TAO', 420, above=True)
-            elif 'pct_sol_below_140' in query_id:
-                return self.calculate_percentage_threshold('SOL', 140, above=False)
-        
-        elif category == 'conditional_threshold':
-            if 'both_sol_eth_green' in query_id:
-                return self.calculate_conditional_threshold('both_sol_eth_green')
-            elif 'sol_up_eth_down' in query_id:
-                return self.calculate_conditional_threshold('sol_up_eth_down')
-            elif 'pct_sol_above_160_when_eth_above_2700' in query_id:
-                return self.calculate_conditional_threshold('sol_above_160_when_eth_above_2700')
-        
-        elif category == 'price_change':
-            if 'sol_price_change_first_half' in query_id:
-                return self.calculate_price_change('SOL', 'first_half')
-            elif 'eth_price_change_second_half' in query_id:
-                return self.calculate_price_change('ETH', 'second_half')
-        
-        elif category == 'rolling_stats':
-            if 'tao_max_5d_rolling_return' in query_id:
-                return self.calculate_rolling_stats('TAO', 'max_5d_rolling_return')
-            elif 'sol_min_3d_rolling_return' in query_id:
-                return self.calculate_rolling_stats('SOL', 'min_3d_rolling_return')
-            elif 'tao_biggest_weekly_gain' in query_id:
-                return self.calculate_rolling_stats('TAO', 'biggest_weekly_gain')
-            elif 'pct_sol_close_above_7dma' in query_id:
-                return self.calculate_rolling_stats('SOL', 'pct_close_above_7dma')
-        
-        elif category == 'streak_analysis':
-            if 'sol_longest_streak_above_155' in query_id:
-                return self.calculate_streak_analysis('SOL', 'longest_streak_above_155')
-            elif 'eth_longest_consecutive_red_days' in query_id:
-                return self.calculate_streak_analysis('ETH', 'longest_consecutive_red_days')
-        
-        elif category == 'volatility':
-            if 'tao_highest_daily_change_date' in query_id:
-                return self.calculate_volatility_stats('TAO', 'highest_daily_change_date')
-            elif 'tao_highest_intraday_swing_date' in query_id:
-                return self.calculate_volatility_stats('TAO', 'highest_intraday_swing_date')
-            elif 'eth_days_change_gt5pct' in query_id:
-                return self.calculate_volatility_stats('ETH', 'days_change_gt5pct')
-            elif 'eth_days_range_gt5pct' in query_id:
-                return self.calculate_volatility_stats('ETH', 'days_range_gt5pct')
-            elif 'eth_biggest_single_day_loss' in query_id:
-                return self.calculate_volatility_stats('ETH', 'biggest_single_day_loss')
-        
-        elif category == 'volatility_stat':
-            if 'eth_stddev_daily_return' in query_id:
-                return self.calculate_volatility_stats('ETH', 'stddev_daily_return')
-            elif 'tao_avg_daily_change' in query_id:
-                return self.calculate_volatility_stats('TAO', 'avg_daily_change')
-        
-        elif category == 'volume_analysis':
-            if 'sol_highest_volume_zscore_day' in query_id:
-                return self.calculate_volume_analysis('SOL', 'highest_volume_zscore_day')
-            elif 'pct_days_tao_vol_gt_2x_avg' in query_id:
-                return self.calculate_volume_analysis('TAO', 'pct_days_vol_gt_2x_avg')
-        
-        elif category == 'conditional_volume':
-            if 'eth_avg_volume_when_sol_drop_gt5' in query_id:
-                return self.calculate_conditional_volume('eth_avg_volume_when_sol_drop_gt5')
-        
-        elif category == 'performance_comparison':
-            if 'rank_by_max_daily_change' in query_id:
-                return self.calculate_ranking('max_daily_change')
-            elif 'rank_by_sharpe' in query_id:
-                # Simplified Sharpe ratio calculation
-                sharpe_ratios = {}
-                for token in self.data:
-                    df = self.data[token]
-                    avg_return = df['daily_return'].mean()
-                    std_return = df['daily_return'].std()
-                    sharpe_ratios[token] = avg_return / std_return if std_return > 0 else 0
-                
-                sorted_tokens = sorted(sharpe_ratios.items(), key=lambda x: x[1], reverse=True)
-                return [token for token, _ in sorted_tokens]
-            elif 'rank_by_total_return' in query_id:
-                return self.calculate_ranking('return')
-            elif 'rank_by_volatility' in query_id:
-                return self.calculate_ranking('volatility')
+        
+        # First matching id fragment within the query's category wins
+        for fragment, handler in _TRUTH_DISPATCH.get(query['category'], ()):
+            if fragment in query_id:
+                return handler(self, query_id)
         
         # Default: return None if we can't calculate
         return None
@@ -510,8 +554,8 @@ class DynamicTruthCalculator:
                 print(f"⚠️  Could not calculate truth for {query['id']}")
         
         # Save updated queries
-        with open(queries_file, 'w') as f:
-            yaml.dump(queries_data, f, default_flow_style=False, indent=2)
+        with open(queries_file, 'w', buffering=1 << 20) as f:
+            yaml.dump(queries_data, f, Dumper=_Dumper, default_flow_style=False, indent=2, allow_unicode=True)
         
         print(f"\n✅ Updated {updated_count} queries with dynamic truth values")
         return updated_count
@@ -4,7 +4,7 @@ Dynamic Truth Calculator (NEW)
 Wraps the original DynamicTruthCalculator but labels subjective / trick / research queries as "human".
 """
 
-from dynamic_truth_calculator import DynamicTruthCalculator
+from dynamic_truth_calculator import DynamicTruthCalculator, _Dumper
 import yaml
 import numpy as np
 from typing import Any, Dict
@@ -271,8 +271,9 @@ class DynamicTruthCalculatorNew(DynamicTruthCalculator):
                 updated += 1
 
         # Always write in place to queries.yaml
-        with open(queries_file, 'w', encoding='utf-8') as f:
-            yaml.dump(queries_data, f, default_flow_style=False, indent=2, sort_keys=False)
+        with open(queries_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            yaml.dump(queries_data, f, Dumper=_Dumper, default_flow_style=False, indent=2,
+                      sort_keys=False, allow_unicode=True)
 
         print(f"💾 Saved updated queries to {queries_file} ({updated} updated)")
         return updated
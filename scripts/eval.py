@@ -3,11 +3,89 @@ import pandas as pd
 import json
 import re
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
 from datetime import datetime
-from typing import Dict, List, Any, Union
+from typing import Dict, List, Any, Optional
 import numpy as np
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Precompiled patterns for the regex fallback's number branch
+_CLEAN_NUM_RE = re.compile(r'\$|\b(?:about|approximately|roughly|around)\b')
+_NEGATIVE_RE = re.compile(r'\bdecreas\w*|\bdown')
+_NUMBER_RE = re.compile(r'([+-]?([0-9]*[.])?[0-9]+)')
+# Whole-word token mentions for the regex fallback's ranking branch
+_RANKING_TOKEN_RE = re.compile(r'\b(SOL|ETH|TAO)\b')
+
+# Structured output schema for ranking extraction (strict mode needs an object root)
+_RANKING_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ranking",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "ranking": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["SOL", "ETH", "TAO"]}
+                }
+            },
+            "required": ["ranking"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Compact per-type extraction prompts, kept short to cut input tokens per call
+_EXTRACTION_PROMPTS = {
+    "number": "Extract the numeric answer from the agent response. Reply with only the number (e.g. 42.5) or null.",
+    "percentage": "Extract the percentage answer from the agent response. Reply with only the number, no % sign (e.g. 15.3), or null.",
+    "date": "Extract the date answer from the agent response. Reply with only the date as YYYY-MM-DD, or null.",
+    "token": "Extract the token answer from the agent response. Reply with only SOL, ETH or TAO, or null.",
+    "ranking": 'Extract the token ranking from the agent response, in order, as {"ranking": ["ETH", "SOL", "TAO"]}.',
+}
+_DEFAULT_EXTRACTION_PROMPT = "Extract the answer from the agent response. Reply with only the value, or null."
+_EXTRACTION_MAX_TOKENS = {"token": 8, "number": 16, "percentage": 16, "date": 16, "ranking": 32}
+
+# expected_type -> category context passed to the LLM extractor
+_EXTRACTOR_CATEGORY = {
+    "percentage": "percentage_threshold",
+    "number": "price_change",
+    "token": "volatility",
+    "date": "price_analysis",
+    "ranking": "performance_comparison",
+}
+
+@dataclass(slots=True)
+class EvalResult:
+    """Evaluation record for a single query"""
+    query_id: str
+    question: str
+    category: str
+    truth: Any
+    explanation: str = ''
+    agent_name: str = "Unknown"
+    agent_response: Optional[str] = None
+    predicted: Any = None
+    correct: bool = False
+    absolute_error: Optional[float] = None
+    error_type: Optional[str] = None
+    is_hallucination: bool = False
+    is_refusal: bool = False
+    llm_evaluation_explanation: str = ''
+    timestamp: str = ''
+
 class TokenAnalyticsEvaluator:
     """
     Automated evaluator for token analytics AI agents
@@ -47,7 +125,7 @@ class TokenAnalyticsEvaluator:
     def _load_queries(self) -> Dict:
         """Load queries from YAML file"""
         with open(self.queries_file, 'r') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=SafeLoader)
     
     def _evaluate_with_llm_judge(self, agent_response: str, question: str, truth_value: Any, query_id: str) -> Dict:
         """Use an LLM to evaluate the agent response against the truth value"""
@@ -149,23 +227,6 @@ Return ONLY the JSON object, no other text."""
         # OpenAI API key is guaranteed to be available at this point
         
         try:
-            # Create parsing prompt
-            system_prompt = f"""You are a data extraction specialist. Extract the specific answer from the agent's response.
-
-Question: {question}
-Category: {category}
-Expected type: {expected_type}
-
-Extract ONLY the answer in the appropriate format:
-- For numbers: return just the number (e.g., 42.5)
-- For percentages: return just the number (e.g., 15.3 for 15.3%)
-- For dates: return YYYY-MM-DD format
-- For tokens: return the token symbol (SOL, ETH, TAO)
-- For rankings: return list of tokens in order (e.g., ["ETH", "SOL", "TAO"])
-- If no clear answer found, return null
-
-Respond with ONLY the extracted value, no explanation."""
-
             headers = {
                 "Authorization": f"Bearer {self.llm_api_key}",
                 "Content-Type": "application/json"
@@ -174,12 +235,15 @@ Respond with ONLY the extracted value, no explanation."""
             data = {
                 "model": "gpt-4o-mini",
                 "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Agent response: {agent_response}"}
+                    {"role": "system", "content": _EXTRACTION_PROMPTS.get(expected_type, _DEFAULT_EXTRACTION_PROMPT)},
+                    {"role": "user", "content": f"Question: {question} ({category})\nAgent response: {agent_response}"}
                 ],
                 "temperature": 0.1,
-                "max_tokens": 50
+                "max_tokens": _EXTRACTION_MAX_TOKENS.get(expected_type, 16)
             }
+            if expected_type == "ranking":
+                # Constrain the output so it always parses to a list of known tokens
+                data["response_format"] = _RANKING_RESPONSE_FORMAT
             
             response = requests.post(
                 "https://api.openai.com/v1/chat/completions",
@@ -207,14 +271,12 @@ Respond with ONLY the extracted value, no explanation."""
                         return extracted_text.upper()
                     return None
                 elif expected_type == "ranking":
+                    # Schema-constrained output, no token validation needed
                     try:
-                        # Parse JSON list
-                        if extracted_text.startswith('[') and extracted_text.endswith(']'):
-                            tokens = json.loads(extracted_text)
-                            if all(t.upper() in ['SOL', 'ETH', 'TAO'] for t in tokens):
-                                return [t.upper() for t in tokens]
-                        return None
-                    except:
+                        if orjson is not None:
+                            return orjson.loads(extracted_text)["ranking"]
+                        return json.loads(extracted_text)["ranking"]
+                    except (ValueError, KeyError, TypeError):
                         return None
                 else:
                     return extracted_text
@@ -254,20 +316,13 @@ Respond with ONLY the extracted value, no explanation."""
                     
         elif expected_type == "number":
             # Remove dollar signs and common words
-            text = text.lower()
-            text = re.sub(r'\$', '', text)
-            text = re.sub(r'\b(about|approximately|roughly|around)\b', '', text)
+            text = _CLEAN_NUM_RE.sub('', text.lower())
             
-            # For price changes, look for decrease/increase context
-            is_negative = False
-            if 'decrease' in text or 'decreased' in text or 'down' in text:
-                is_negative = True
-            elif 'increase' in text or 'increased' in text or 'up' in text:
-                is_negative = False
+            # For price changes, look for decrease context
+            is_negative = _NEGATIVE_RE.search(text) is not None
             
             # Find numbers (including decimals and negatives)
-            number_pattern = r'([+-]?([0-9]*[.])?[0-9]+)'
-            match = re.search(number_pattern, text)
+            match = _NUMBER_RE.search(text)
             if match:
                 try:
                     value = float(match.group(1))
@@ -291,108 +346,26 @@ Respond with ONLY the extracted value, no explanation."""
                     return token
                     
         elif expected_type == "ranking":
-            text = text.upper()
-            tokens = ['SOL', 'ETH', 'TAO']
+            # Whole-word token mentions in one pass; keep each token's first position
             found_tokens = []
-            
-            # Remove common ranking words and symbols
-            text = re.sub(r'\b(ranked|ranking|order|by|as|follows?|is|are)\b', '', text)
-            text = re.sub(r'[->>\-\s]+', ' ', text)
-            text = re.sub(r'[,\s]+', ' ', text)
-            
-            # Split by spaces and find tokens in order
-            words = text.split()
-            for word in words:
-                if word in tokens and word not in found_tokens:
-                    found_tokens.append(word)
-            
-            # If we found tokens but not all 3, try a different approach
-            if found_tokens and len(found_tokens) < 3:
-                for token in tokens:
-                    if token in text and token not in found_tokens:
-                        found_tokens.append(token)
+            for match in _RANKING_TOKEN_RE.finditer(text.upper()):
+                token = match.group(1)
+                if token not in found_tokens:
+                    found_tokens.append(token)
             
             return found_tokens if found_tokens else None
         
         return None
     
-    def _extract_numeric_percentage(self, text: str) -> Union[float, None]:
-        """
-        Extract percentage value from text response
-        Handles formats like 'about 9.7%', 'approximately 45.2%', 'roughly 64.5%'
-        """
-        if not text:
-            return None
-            
-        # Use LLM for extraction
-        return self._extract_with_llm(text, "percentage_threshold", "percentage_threshold", "percentage")
-    
-    def _extract_plain_number(self, text: str) -> Union[float, None]:
-        """
-        Extract any numeric value, ignoring $ signs and common words
-        Handles formats like '$33.15', 'about 2.31', 'approximately -1.16'
-        """
-        if not text:
-            return None
-            
-        # Use LLM for extraction
-        return self._extract_with_llm(text, "price_change", "price_change", "number")
-    
-    def _extract_number_from_text(self, text: str) -> Union[float, None]:
+    def _extract(self, text: str, question: str, expected_type: str) -> Any:
         """
-        Legacy function - now delegates to appropriate extractor
-        """
-        return self._extract_plain_number(text)
-    
-    def _extract_token_from_text(self, text: str) -> Union[str, None]:
-        """
-        Extract token symbol from text response
+        Extract a value of the given expected type from a text response
+        Dispatches to the LLM extractor with the original question and matching category context
         """
         if not text:
             return None
             
-        # Use LLM for extraction
-        return self._extract_with_llm(text, "volatility", "volatility", "token")
-    
-    def _extract_token_name(self, text: str, token_list: List[str] = None) -> Union[str, None]:
-        """
-        Extract token name from text response with fallback
-        """
-        if not text:
-            return None
-            
-        if token_list is None:
-            token_list = ['SOL', 'ETH', 'TAO']
-            
-        # Use LLM for extraction
-        return self._extract_with_llm(text, "volatility", "volatility", "token")
-    
-    def _extract_date_from_text(self, text: str) -> Union[str, None]:
-        """
-        Extract date from text response
-        """
-        if not text:
-            return None
-            
-        # Use LLM for extraction
-        return self._extract_with_llm(text, "price_analysis", "price_analysis", "date")
-    
-    def _normalize_ranking(self, text: str) -> Union[List[str], None]:
-        """
-        Extract and normalize ranking from text response
-        Handles formats like 'ETH, SOL, TAO', 'ETH->SOL->TAO', 'ETH > SOL > TAO'
-        """
-        if not text:
-            return None
-            
-        # Use LLM for extraction
-        return self._extract_with_llm(text, "performance_comparison", "performance_comparison", "ranking")
-    
-    def _extract_list_from_text(self, text: str) -> Union[List[str], None]:
-        """
-        Legacy function - now delegates to normalize_ranking
-        """
-        return self._normalize_ranking(text)
+        return self._extract_with_llm(text, question, _EXTRACTOR_CATEGORY[expected_type], expected_type)
     
     def _calculate_accuracy(self, predicted: Any, truth: Any, category: str) -> Dict:
         """
@@ -426,7 +399,15 @@ Respond with ONLY the extracted value, no explanation."""
             
         return result
     
-    def evaluate_agent_response(self, query_id: str, agent_response: str, agent_name: str = "Unknown") -> Dict:
+    @staticmethod
+    def _as_float(value: Any) -> float:
+        """Return value as a float, or NaN when it is not numeric"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return np.nan
+    
+    def evaluate_agent_response(self, query_id: str, agent_response: str, agent_name: str = "Unknown",
+                                timestamp: Optional[str] = None) -> EvalResult:
         """
         Evaluate a single agent response against the truth
         
@@ -434,9 +415,10 @@ Respond with ONLY the extracted value, no explanation."""
             query_id: ID of the query being evaluated
             agent_response: Raw text response from the agent
             agent_name: Name/identifier of the agent
+            timestamp: ISO timestamp to record (defaults to now)
             
         Returns:
-            Dictionary with evaluation results
+            EvalResult record with evaluation results
         """
         # Find the query
         query = None
@@ -457,75 +439,94 @@ Respond with ONLY the extracted value, no explanation."""
             query_id
         )
         
-        result = {
-            'query_id': query_id,
-            'question': query['question'],
-            'category': category,
-            'truth': query['truth'],
-            'explanation': query.get('explanation', ''),  # May not exist after cleanup
-            'agent_name': agent_name,
-            'agent_response': agent_response,
-            'predicted': evaluation['extracted_value'],
-            'correct': evaluation['correct'],
-            'absolute_error': evaluation['absolute_error'],
-            'error_type': evaluation['error_type'],
-            'is_hallucination': evaluation['is_hallucination'],
-            'is_refusal': evaluation['is_refusal'],
-            'llm_evaluation_explanation': evaluation['explanation'],
-            'timestamp': datetime.now().isoformat()
-        }
+        result = EvalResult(
+            query_id=query_id,
+            question=query['question'],
+            category=category,
+            truth=query['truth'],
+            explanation=query.get('explanation', ''),  # May not exist after cleanup
+            agent_name=agent_name,
+            agent_response=agent_response,
+            predicted=evaluation['extracted_value'],
+            correct=evaluation['correct'],
+            absolute_error=evaluation['absolute_error'],
+            error_type=evaluation['error_type'],
+            is_hallucination=evaluation['is_hallucination'],
+            is_refusal=evaluation['is_refusal'],
+            llm_evaluation_explanation=evaluation['explanation'],
+            timestamp=timestamp or datetime.now().isoformat()
+        )
         
         return result
     
-    def run_evaluation(self, agent_responses: Dict[str, str], agent_name: str = "Unknown") -> Dict:
+    def run_evaluation(self, agent_responses: Dict[str, str], agent_name: str = "Unknown", max_workers: int = 10) -> Dict:
         """
         Run full evaluation on all queries
         
         Args:
             agent_responses: Dictionary mapping query_id to agent response
             agent_name: Name/identifier of the agent
+            max_workers: Number of concurrent LLM judge calls
             
         Returns:
             Summary statistics and detailed results
         """
-        results = []
+        queries = self.queries['queries']
+        results: List[Optional[EvalResult]] = [None] * len(queries)
         
-        for query in self.queries['queries']:
-            query_id = query['id']
-            
-            if query_id in agent_responses:
-                result = self.evaluate_agent_response(
-                    query_id, 
-                    agent_responses[query_id], 
-                    agent_name
-                )
-                results.append(result)
-            else:
-                # Missing response
-                result = {
-                    'query_id': query_id,
-                    'question': query['question'],
-                    'category': query['category'],
-                    'truth': query['truth'],
-                    'agent_name': agent_name,
-                    'agent_response': None,
-                    'predicted': None,
-                    'correct': False,
-                    'absolute_error': None,
-                    'error_type': 'missing_response',
-                    'is_hallucination': False,
-                    'timestamp': datetime.now().isoformat()
-                }
-                results.append(result)
+        # One timestamp for the whole run, shared by every result record
+        run_ts = datetime.now().isoformat()
+        
+        # LLM judge calls are network-bound, so run them on a thread pool
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for i, query in enumerate(queries):
+                query_id = query['id']
+                
+                if query_id in agent_responses:
+                    future = executor.submit(
+                        self.evaluate_agent_response,
+                        query_id, 
+                        agent_responses[query_id], 
+                        agent_name,
+                        run_ts
+                    )
+                    futures[future] = i
+                else:
+                    # Missing response
+                    results[i] = EvalResult(
+                        query_id=query_id,
+                        question=query['question'],
+                        category=query['category'],
+                        truth=query['truth'],
+                        agent_name=agent_name,
+                        error_type='missing_response',
+                        timestamp=run_ts
+                    )
+            
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
         
-        # Calculate summary statistics
+        # Calculate summary statistics from column arrays built in one pass
         total_queries = len(results)
-        correct_answers = sum(1 for r in results if r['correct'])
-        hallucinations = sum(1 for r in results if r['is_hallucination'])
+        correct = np.array([bool(r.correct) for r in results], dtype=bool)
+        is_hallucination = np.array([bool(r.is_hallucination) for r in results], dtype=bool)
+        categories = np.array([r.category for r in results], dtype=object)
+        predicted = np.array([self._as_float(r.predicted) for r in results], dtype=float)
+        abs_errors = np.array([self._as_float(r.absolute_error) for r in results], dtype=float)
+        
+        # Percentages outside 0-100 are impossible answers, flag them as hallucinations
+        out_of_range = (categories == 'percentage_threshold') & ((predicted > 100) | (predicted < 0))
+        for i in np.flatnonzero(out_of_range & ~is_hallucination):
+            results[i].is_hallucination = True
+        is_hallucination |= out_of_range
+        
+        correct_answers = int(correct.sum())
+        hallucinations = int(is_hallucination.sum())
         
         # Calculate average absolute error for numeric responses
-        numeric_errors = [r['absolute_error'] for r in results if r['absolute_error'] is not None]
-        avg_absolute_error = np.mean(numeric_errors) if numeric_errors else 0
+        numeric_errors = abs_errors[~np.isnan(abs_errors)]
+        avg_absolute_error = float(numeric_errors.mean()) if numeric_errors.size else 0
         
         summary = {
             'agent_name': agent_name,
@@ -535,8 +536,8 @@ Respond with ONLY the extracted value, no explanation."""
             'hallucination_count': hallucinations,
             'hallucination_rate': (hallucinations / total_queries) * 100 if total_queries > 0 else 0,
             'average_absolute_error': avg_absolute_error,
-            'results': results,
-            'timestamp': datetime.now().isoformat()
+            'results': [asdict(r) for r in results],
+            'timestamp': run_ts
         }
         
         return summary
@@ -572,8 +573,13 @@ Respond with ONLY the extracted value, no explanation."""
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"evaluation_results_{summary['agent_name']}_{timestamp}.json"
         
-        with open(filename, 'w') as f:
-            json.dump(summary, f, indent=2)
+        if orjson is not None:
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(summary, default=str,
+                                     option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(filename, 'w') as f:
+                json.dump(summary, f, indent=2, default=str)
         
         print(f"\n💾 Results saved to: {filename}")
 
@@ -3,43 +3,35 @@
 Fix queries.yaml format by converting numpy values to regular Python numbers
 """
 
+import os
+import sys
 import yaml
-import numpy as np
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Dumper that emits numpy scalars and arrays as native YAML scalars/lists, shared with the truth calculator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dynamic_data_generation'))
+from dynamic_truth_calculator import _Dumper
 
 def fix_queries_yaml():
     """Fix the YAML format by converting numpy values to regular Python numbers"""
     
     # Load the current queries
     with open('data/queries.yaml', 'r') as f:
-        data = yaml.safe_load(f)
-    
-    # Convert numpy values to regular Python numbers
-    def convert_numpy_values(obj):
-        if isinstance(obj, dict):
-            return {k: convert_numpy_values(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_numpy_values(item) for item in obj]
-        elif isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        else:
-            return obj
-    
-    # Convert all numpy values
-    fixed_data = convert_numpy_values(data)
+        data = yaml.load(f, Loader=SafeLoader)
     
-    # Save the fixed version
+    # Save the fixed version (numpy values are converted by the dumper's representers)
     with open('data/queries.yaml', 'w') as f:
-        yaml.dump(fixed_data, f, default_flow_style=False, sort_keys=False)
+        yaml.dump(data, f, Dumper=_Dumper, default_flow_style=False, sort_keys=False)
     
     print("✅ Fixed queries.yaml - converted numpy values to regular Python numbers")
     
     # Print summary
-    total_questions = len(fixed_data['queries'])
-    easy_questions = sum(1 for q in fixed_data['queries'] if q['id'].startswith('easy_'))
+    total_questions = len(data['queries'])
+    easy_questions = sum(1 for q in data['queries'] if q['id'].startswith('easy_'))
     hard_questions = total_questions - easy_questions
     
     print(f"📊 Total questions: {total_questions}")
@@ -47,4 +39,4 @@ def fix_queries_yaml():
     print(f"🎯 Hard questions: {hard_questions}")
 
 if __name__ == "__main__":
-    fix_queries_yaml() 
\ No newline at end of file
+    fix_queries_yaml()
@@ -7,8 +7,14 @@ Tracks AI performance, evaluations, and metrics in Langfuse
 import os
 import json
 import time
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+import uuid
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Iterable, Iterator
+import pandas as pd
+import requests
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -24,28 +30,132 @@ except ImportError:
     print("LANGFUSE_HOST=https://us.cloud.langfuse.com")
     exit(1)
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Column order of the per-question table attached to each evaluation trace
+_PER_QUESTION_SCHEMA = ["query_id", "truth", "predicted", "absolute_error", "error_type", "is_hallucination"]
+
+# Background flush threads started by trackers; joined once before exit
+_flush_threads: List[threading.Thread] = []
+
 class LangfuseTokenAnalyticsTracker:
     """Track token analytics evaluations in Langfuse"""
     
     def __init__(self):
         """Initialize Langfuse client"""
-        self.langfuse = Langfuse(
-            public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-            secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-            host=os.getenv("LANGFUSE_HOST", "https://us.cloud.langfuse.com")
-        )
-        
-        if not os.getenv("LANGFUSE_PUBLIC_KEY") or not os.getenv("LANGFUSE_SECRET_KEY"):
+        self.public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
+        self.secret_key = os.getenv("LANGFUSE_SECRET_KEY")
+        self.host = os.getenv("LANGFUSE_HOST", "https://us.cloud.langfuse.com")
+        self._flush_thread = None
+        # Without credentials every trace would be dropped, so don't build any
+        self.enabled = bool(self.public_key and self.secret_key)
+        if not self.enabled:
+            self.langfuse = None
             print("⚠️  Langfuse credentials not found in .env")
             print("Please add LANGFUSE_PUBLIC_KEY and LANGFUSE_SECRET_KEY to your .env file")
+            return
+        self.langfuse = Langfuse(
+            public_key=self.public_key,
+            secret_key=self.secret_key,
+            host=self.host,
+            flush_at=int(os.getenv("LF_FLUSH_AT", "50")),
+            flush_interval=float(os.getenv("LF_FLUSH_INTERVAL", "1.0"))
+        )
+    
+    def async_flush(self):
+        """Flush queued Langfuse events in a daemon thread so callers don't block on upload"""
+        if not self.enabled:
+            return
+        self._flush_thread = threading.Thread(target=self.langfuse.flush, daemon=True)
+        self._flush_thread.start()
+        _flush_threads.append(self._flush_thread)
+    
+    def _event(self, event_type: str, body: Dict[str, Any], ts_iso: str) -> Dict[str, Any]:
+        """Wrap an event body in a Langfuse ingestion envelope"""
+        return {
+            "id": str(uuid.uuid4()),
+            "timestamp": ts_iso,
+            "type": event_type,
+            "body": body
+        }
+    
+    def _score_event(self, trace_id: str, name: str, value: float, comment: str, ts_iso: str) -> Dict[str, Any]:
+        """Build a score-create ingestion event for a trace"""
+        return self._event("score-create", {
+            "id": str(uuid.uuid4()),
+            "traceId": trace_id,
+            "name": name,
+            "value": value,
+            "comment": comment
+        }, ts_iso)
+    
+    def _ingest_batch(self, events: List[Dict[str, Any]]):
+        """Send all collected events to the Langfuse ingestion API in one request"""
+        if not events:
+            return
+        payload = {"batch": events}
+        if orjson is not None:
+            body = {
+                "data": orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY),
+                "headers": {"Content-Type": "application/json"}
+            }
+        else:
+            body = {"json": payload}
+        # Tracing is best-effort: a Langfuse outage must not abort the evaluation run
+        try:
+            response = requests.post(
+                f"{self.host}/api/public/ingestion",
+                auth=(self.public_key, self.secret_key),
+                timeout=30,
+                **body
+            )
+        except requests.RequestException as e:
+            print(f"⚠️  Langfuse ingestion failed: {e}")
+            return
+        if response.status_code not in (200, 207):
+            print(f"⚠️  Langfuse ingestion failed: {response.status_code} - {response.text}")
+            return
+        # 207 Multi-Status: the request went through but individual events may have been rejected
+        if response.status_code == 207:
+            try:
+                errors = response.json().get("errors") or []
+            except ValueError:
+                errors = []
+            if errors:
+                print(f"⚠️  Langfuse rejected {len(errors)}/{len(events)} events")
+                for error in errors[:5]:
+                    print(f"   {error.get('id')}: {error.get('status')} - {error.get('message') or error.get('error')}")
     
     def create_evaluation_trace(self, 
                               agent_name: str, 
                               evaluation_results: Dict[str, Any],
-                              agent_responses: Dict[str, str]) -> str:
-        """Create a trace for a complete evaluation"""
+                              agent_responses: Dict[str, str],
+                              results_iter: Optional[Iterable[Dict[str, Any]]] = None,
+                              per_question_spans: bool = True) -> Optional[str]:
+        """Create a trace for a complete evaluation
+        
+        Per-question results are taken from results_iter when given (e.g. a streaming
+        parser), otherwise from evaluation_results["results"]. Truth/prediction/error
+        values are attached once to the root span as a columnar "per_question" table;
+        set per_question_spans=False to skip the individual question spans entirely.
+        """
+        if not self.enabled:
+            return None
         
-        trace_id = f"token_analytics_eval_{agent_name}_{int(time.time())}"
+        # One clock read per trace, reused by every span and score event
+        now = datetime.now(timezone.utc)
+        ts_iso = now.isoformat()
+        ts_epoch = int(now.timestamp())
+        trace_id = f"token_analytics_eval_{agent_name}_{ts_epoch}"
+        events = []
         
         # Create the main trace using the new API
         with self.langfuse.start_as_current_span(
@@ -57,187 +167,218 @@ class LangfuseTokenAnalyticsTracker:
                 "accuracy_percentage": evaluation_results.get("accuracy_percentage", 0),
                 "hallucination_rate": evaluation_results.get("hallucination_rate", 0),
                 "average_absolute_error": evaluation_results.get("average_absolute_error", 0),
-                "evaluation_timestamp": datetime.now().isoformat()
+                "evaluation_timestamp": ts_iso
             }
-        ):
+        ) as root_span:
+            langfuse_trace_id = root_span.trace_id
             # Add overall score
             overall_score = evaluation_results.get("accuracy_percentage", 0)
-            self.langfuse.score_current_trace(
-                name="overall_accuracy",
-                value=overall_score / 100,  # Convert to 0-1 scale
-                comment=f"Overall accuracy: {overall_score:.1f}%"
-            )
+            events.append(self._score_event(
+                langfuse_trace_id,
+                "overall_accuracy",
+                overall_score / 100,  # Convert to 0-1 scale
+                f"Overall accuracy: {overall_score:.1f}%",
+                ts_iso
+            ))
             # Add hallucination score (inverted - lower is better)
             hallucination_rate = evaluation_results.get("hallucination_rate", 0)
-            self.langfuse.score_current_trace(
-                name="hallucination_rate",
-                value=1 - (hallucination_rate / 100),  # Invert so lower hallucination = higher score
-                comment=f"Hallucination rate: {hallucination_rate:.1f}%"
-            )
-            # Create spans for each question
-            for result in evaluation_results.get("results", []):
-                self._create_question_span(result, agent_responses.get(result["query_id"], ""))
+            events.append(self._score_event(
+                langfuse_trace_id,
+                "hallucination_rate",
+                1 - (hallucination_rate / 100),  # Invert so lower hallucination = higher score
+                f"Hallucination rate: {hallucination_rate:.1f}%",
+                ts_iso
+            ))
+            # Create spans for each question, collecting their scores for one batch upload
+            if results_iter is None:
+                results_iter = evaluation_results.get("results", [])
+            rows = []
+            for result in results_iter:
+                rows.append(tuple(result.get(key) for key in _PER_QUESTION_SCHEMA))
+                events.extend(self._create_question_span(
+                    result, agent_responses.get(result["query_id"], ""), langfuse_trace_id, ts_iso=ts_iso,
+                    create_span=per_question_spans
+                ))
+            # Schema once, rows many: field names are sent a single time per trace
+            root_span.update(metadata={"per_question": {"schema": _PER_QUESTION_SCHEMA, "rows": rows}})
+        self._ingest_batch(events)
+        self.async_flush()
         print(f"✅ Created Langfuse trace: {trace_id}")
         return trace_id
     
-    def _create_question_span(self, result: Dict[str, Any], agent_response: str):
-        """Create a span for a single question evaluation"""
-        with self.langfuse.start_as_current_span(
-            name=f"Question: {result['query_id']}",
-            metadata={
-                "query_id": result["query_id"],
-                "category": result.get("category", "unknown"),
-                "question": result.get("question", ""),
-                "truth": result.get("truth"),
-                "predicted": result.get("predicted"),
-                "correct": result.get("correct", False),
-                "error_type": result.get("error_type"),
-                "is_hallucination": result.get("is_hallucination", False),
-                "absolute_error": result.get("absolute_error")
-            }
-        ):
-            # Add the generation (AI response)
-            if agent_response:
-                with self.langfuse.start_as_current_span(name="AI Response", metadata={
+    def _create_question_span(self, result: Dict[str, Any], agent_response: str, langfuse_trace_id: str, ts_iso: str,
+                              create_span: bool = True) -> List[Dict[str, Any]]:
+        """Create a span for a single question evaluation and return its score events"""
+        events = []
+        if create_span:
+            with self.langfuse.start_as_current_span(
+                name=f"Question: {result['query_id']}",
+                metadata={
                     "query_id": result["query_id"],
                     "category": result.get("category", "unknown"),
-                    "model": result.get("agent_name", "Unknown"),
-                    "input": result.get("question", ""),
-                    "output": agent_response
-                }):
-                    pass
-            # Add scores for this question
-            if result.get("correct", False):
-                self.langfuse.score_current_trace(
-                    name="correctness", 
-                    value=1.0, 
-                    comment="Correct answer"
-                )
-            else:
-                self.langfuse.score_current_trace(
-                    name="correctness", 
-                    value=0.0, 
-                    comment="Incorrect answer"
-                )
-            if result.get("is_hallucination", False):
-                self.langfuse.score_current_trace(
-                    name="hallucination", 
-                    value=0.0, 
-                    comment="Hallucination detected"
-                )
-            else:
-                self.langfuse.score_current_trace(
-                    name="hallucination", 
-                    value=1.0, 
-                    comment="No hallucination"
-                )
-            # Add error score if applicable
-            if result.get("absolute_error") is not None:
-                error = result["absolute_error"]
-                error_score = max(0, 1 - (error / 100))  # Assuming max error of 100%
-                self.langfuse.score_current_trace(
-                    name="precision", 
-                    value=error_score, 
-                    comment=f"Error: {error}"
-                )
+                    "question": result.get("question", ""),
+                    "correct": result.get("correct", False),
+                    # AI response is kept on the question span rather than a separate child observation
+                    "ai_response": agent_response[:4096] if agent_response else None
+                }
+            ):
+                pass
+        # Add scores for this question
+        if result.get("correct", False):
+            events.append(self._score_event(langfuse_trace_id, "correctness", 1.0, "Correct answer", ts_iso))
+        else:
+            events.append(self._score_event(langfuse_trace_id, "correctness", 0.0, "Incorrect answer", ts_iso))
+        if result.get("is_hallucination", False):
+            events.append(self._score_event(langfuse_trace_id, "hallucination", 0.0, "Hallucination detected", ts_iso))
+        else:
+            events.append(self._score_event(langfuse_trace_id, "hallucination", 1.0, "No hallucination", ts_iso))
+        # Add error score if applicable
+        if result.get("absolute_error") is not None:
+            error = result["absolute_error"]
+            error_score = max(0, 1 - (error / 100))  # Assuming max error of 100%
+            events.append(self._score_event(langfuse_trace_id, "precision", error_score, f"Error: {error}", ts_iso))
+        return events
     
     def track_agent_comparison(self, 
                               comparison_results: Dict[str, Any],
-                              agent_names: List[str]) -> str:
+                              agent_names: List[str]) -> Optional[str]:
         """Track comparison between multiple agents"""
+        if not self.enabled:
+            return None
         trace_id = f"agent_comparison_{int(time.time())}"
+        ts_iso = datetime.now(timezone.utc).isoformat()
+        events = []
         with self.langfuse.start_as_current_span(
             name="Token Analytics Agent Comparison",
             metadata={
                 "agent_names": agent_names,
                 "comparison_timestamp": datetime.now().isoformat()
             }
-        ):
+        ) as root_span:
+            langfuse_trace_id = root_span.trace_id
+            # Track the best agent while collecting scores instead of a second max() pass
+            best_agent, best_accuracy = None, -1.0
             for agent_name, results in comparison_results.items():
-                accuracy = results.get("evaluation_summary", {}).get("accuracy_percentage", 0)
-                hallucination_rate = results.get("evaluation_summary", {}).get("hallucination_rate", 0)
-                self.langfuse.score_current_trace(
-                    name=f"{agent_name}_accuracy",
-                    value=accuracy / 100,
-                    comment=f"{agent_name} accuracy: {accuracy:.1f}%"
-                )
-                self.langfuse.score_current_trace(
-                    name=f"{agent_name}_hallucination",
-                    value=1 - (hallucination_rate / 100),
-                    comment=f"{agent_name} hallucination rate: {hallucination_rate:.1f}%"
-                )
-            best_agent = max(comparison_results.keys(), 
-                            key=lambda x: comparison_results[x].get("evaluation_summary", {}).get("accuracy_percentage", 0))
-            self.langfuse.score_current_trace(
-                name="best_agent",
-                value=1.0,
-                comment=f"Best performing agent: {best_agent}"
-            )
+                summary = results.get("evaluation_summary", {})
+                accuracy = summary.get("accuracy_percentage", 0)
+                hallucination_rate = summary.get("hallucination_rate", 0)
+                if accuracy > best_accuracy:
+                    best_agent, best_accuracy = agent_name, accuracy
+                events.append(self._score_event(
+                    langfuse_trace_id, f"{agent_name}_accuracy", accuracy / 100,
+                    f"{agent_name} accuracy: {accuracy:.1f}%", ts_iso
+                ))
+                events.append(self._score_event(
+                    langfuse_trace_id, f"{agent_name}_hallucination", 1 - (hallucination_rate / 100),
+                    f"{agent_name} hallucination rate: {hallucination_rate:.1f}%", ts_iso
+                ))
+            events.append(self._score_event(
+                langfuse_trace_id, "best_agent", 1.0, f"Best performing agent: {best_agent}", ts_iso
+            ))
+        self._ingest_batch(events)
+        self.async_flush()
         print(f"✅ Created comparison trace: {trace_id}")
         return trace_id
     
     def track_easy_vs_hard_performance(self, 
                                       evaluation_results: Dict[str, Any],
-                                      agent_name: str) -> str:
+                                      agent_name: str) -> Optional[str]:
         """Track performance on easy vs hard questions"""
+        if not self.enabled:
+            return None
         trace_id = f"difficulty_analysis_{agent_name}_{int(time.time())}"
+        ts_iso = datetime.now(timezone.utc).isoformat()
+        events = []
         with self.langfuse.start_as_current_span(
             name=f"Difficulty Analysis - {agent_name}",
             metadata={
                 "agent_name": agent_name,
                 "analysis_timestamp": datetime.now().isoformat()
             }
-        ):
-            easy_results = []
-            hard_results = []
-            for result in evaluation_results.get("results", []):
-                if result.get("query_id", "").startswith("easy_"):
-                    easy_results.append(result)
-                else:
-                    hard_results.append(result)
-            if easy_results:
-                easy_correct = sum(1 for r in easy_results if r.get("correct", False))
-                easy_accuracy = (easy_correct / len(easy_results)) * 100
-                easy_hallucination = (sum(1 for r in easy_results if r.get("is_hallucination", False)) / len(easy_results)) * 100
-                self.langfuse.score_current_trace(
-                    name="easy_questions_accuracy",
-                    value=easy_accuracy / 100,
-                    comment=f"Easy questions accuracy: {easy_accuracy:.1f}%"
-                )
-                self.langfuse.score_current_trace(
-                    name="easy_questions_hallucination",
-                    value=1 - (easy_hallucination / 100),
-                    comment=f"Easy questions hallucination: {easy_hallucination:.1f}%"
-                )
-            if hard_results:
-                hard_correct = sum(1 for r in hard_results if r.get("correct", False))
-                hard_accuracy = (hard_correct / len(hard_results)) * 100
-                hard_hallucination = (sum(1 for r in hard_results if r.get("is_hallucination", False)) / len(hard_results)) * 100
-                self.langfuse.score_current_trace(
-                    name="hard_questions_accuracy",
-                    value=hard_accuracy / 100,
-                    comment=f"Hard questions accuracy: {hard_accuracy:.1f}%"
-                )
-                self.langfuse.score_current_trace(
-                    name="hard_questions_hallucination",
-                    value=1 - (hard_hallucination / 100),
-                    comment=f"Hard questions hallucination: {hard_hallucination:.1f}%"
-                )
+        ) as root_span:
+            langfuse_trace_id = root_span.trace_id
+            # Vectorized easy/hard partition over the results table
+            df = pd.DataFrame(evaluation_results.get("results", []),
+                              columns=["query_id", "correct", "is_hallucination"])
+            easy_mask = df["query_id"].fillna("").astype(str).str.startswith("easy_").to_numpy()
+            correct = df["correct"].fillna(False).to_numpy(dtype=bool)
+            halluc = df["is_hallucination"].fillna(False).to_numpy(dtype=bool)
+            for level, mask in (("easy", easy_mask), ("hard", ~easy_mask)):
+                if not mask.any():
+                    continue
+                accuracy = correct[mask].mean() * 100
+                hallucination = halluc[mask].mean() * 100
+                events.append(self._score_event(
+                    langfuse_trace_id, f"{level}_questions_accuracy", accuracy / 100,
+                    f"{level.capitalize()} questions accuracy: {accuracy:.1f}%", ts_iso
+                ))
+                events.append(self._score_event(
+                    langfuse_trace_id, f"{level}_questions_hallucination", 1 - (hallucination / 100),
+                    f"{level.capitalize()} questions hallucination: {hallucination:.1f}%", ts_iso
+                ))
+        self._ingest_batch(events)
+        self.async_flush()
         print(f"✅ Created difficulty analysis trace: {trace_id}")
         return trace_id
 
-def integrate_with_existing_evaluation(evaluation_file: str, agent_name: str):
+def _load_json(path: str) -> Any:
+    """Load a JSON file, using orjson when available"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _stream_evaluation(evaluation_file: str, summary: Dict[str, Any],
+                       difficulty_rows: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Parse an evaluation file in one streaming pass
+    
+    Top-level scalar fields are written into summary as they are reached, the columns the
+    difficulty analysis needs are appended to difficulty_rows, and each per-question result
+    is yielded as soon as it is complete.
+    """
+    builder = None
+    with open(evaluation_file, 'rb') as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is not None or (prefix == 'results.item' and event == 'start_map'):
+                if builder is None:
+                    builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                if prefix == 'results.item' and event == 'end_map':
+                    result = builder.value
+                    builder = None
+                    difficulty_rows.append({key: result.get(key) for key in ("query_id", "correct", "is_hallucination")})
+                    yield result
+            elif prefix and '.' not in prefix and event in ('number', 'string', 'boolean', 'null'):
+                summary[prefix] = value
+
+def integrate_with_existing_evaluation(tracker: LangfuseTokenAnalyticsTracker, evaluation_file: str, agent_name: str):
     """Integrate existing evaluation results with Langfuse"""
-    with open(evaluation_file, 'r') as f:
-        evaluation_results = json.load(f)
+    if not tracker.enabled:
+        print(f"⏭️  Skipping {agent_name}: Langfuse tracking disabled")
+        return None
     responses_file = evaluation_file.replace("_evaluation_results.json", "_raw_responses.json")
     if os.path.exists(responses_file):
-        with open(responses_file, 'r') as f:
-            agent_responses = json.load(f)
+        agent_responses = _load_json(responses_file)
     else:
         agent_responses = {}
-    tracker = LangfuseTokenAnalyticsTracker()
-    trace_id = tracker.create_evaluation_trace(agent_name, evaluation_results, agent_responses)
+    if ijson is not None:
+        # Stream results so spans are emitted while the file is still being parsed
+        evaluation_results = {}
+        difficulty_rows = []
+        results_iter = _stream_evaluation(evaluation_file, evaluation_results, difficulty_rows)
+        # The summary fields precede "results" in the file, so they are parsed by the time the first result is
+        first = next(results_iter, None)
+        if first is not None:
+            results_iter = itertools.chain((first,), results_iter)
+        trace_id = tracker.create_evaluation_trace(
+            agent_name, evaluation_results, agent_responses, results_iter=results_iter
+        )
+        # Same pass: the rows were collected while the trace consumed the results
+        evaluation_results["results"] = difficulty_rows
+    else:
+        evaluation_results = _load_json(evaluation_file)
+        trace_id = tracker.create_evaluation_trace(agent_name, evaluation_results, agent_responses)
     difficulty_trace_id = tracker.track_easy_vs_hard_performance(evaluation_results, agent_name)
     print(f"📊 Langfuse integration complete!")
     print(f"   Main trace: {trace_id}")
@@ -252,11 +393,18 @@ def main():
         "test/perplexity_evaluation_results.json"
     ]
     tracker = LangfuseTokenAnalyticsTracker()
-    for eval_file in evaluation_files:
-        if os.path.exists(eval_file):
-            agent_name = "ChatGPT" if "chatgpt" in eval_file else "Perplexity"
-            print(f"\n📊 Integrating {agent_name} evaluation...")
-            integrate_with_existing_evaluation(eval_file, agent_name)
+    jobs = [(path, "ChatGPT" if "chatgpt" in path else "Perplexity")
+            for path in evaluation_files if os.path.exists(path)]
+    def integrate_file(job):
+        eval_file, agent_name = job
+        print(f"\n📊 Integrating {agent_name} evaluation...")
+        return integrate_with_existing_evaluation(tracker, eval_file, agent_name)
+    # Files upload independently, so overlap their Langfuse I/O
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(integrate_file, jobs))
+    # Wait for all background uploads before exiting
+    for thread in _flush_threads:
+        thread.join()
     print("\n✅ Langfuse integration complete!")
     print("\n📋 Next steps:")
     print("1. View traces in Langfuse dashboard")
@@ -5,16 +5,21 @@ Combines LLM evaluation, grading scale, and comprehensive reporting
 """
 
 import argparse
+import heapq
 import json
 import sys
 import os
 from datetime import datetime
+from operator import itemgetter
 from typing import Dict, List, Any
 
 # Import our components
 from scripts.eval import TokenAnalyticsEvaluator
 from scripts.grading_scale import AnalyticsGradingScale
 
+# Row layout for the agent comparison table, parsed once
+_COMPARISON_ROW_FMT = "{name:<20} {grade:<5} {score:<8.1f} {accuracy:<10.1f}% {hallucination:<12.1f}%"
+
 def load_agent_responses(file_path: str) -> Dict[str, str]:
     """Load agent responses from JSON file"""
     try:
@@ -166,8 +171,10 @@ def print_detailed_analysis(report: Dict[str, Any]):
     
     # Top and bottom performers
     detailed_results = grading_report['detailed_results']
-    top_performers = sorted(detailed_results, key=lambda x: x['score'], reverse=True)[:3]
-    bottom_performers = sorted(detailed_results, key=lambda x: x['score'])[:3]
+    # nlargest/nsmallest keep the same tie order as sorted()[:3] without sorting everything
+    by_score = itemgetter('score')
+    top_performers = heapq.nlargest(3, detailed_results, key=by_score)
+    bottom_performers = heapq.nsmallest(3, detailed_results, key=by_score)
     
     print(f"\n🏆 Top Performers:")
     for result in top_performers:
@@ -204,7 +211,13 @@ def compare_agents(agent_files: List[str], agent_names: List[str] = None) -> Dic
     for agent_name, report in comparison_results.items():
         eval_summary = report['evaluation_summary']
         grading_report = report['grading_report']
-        print(f"{agent_name:<20} {grading_report['overall_grade']:<5} {grading_report['overall_score']:<8.1f} {eval_summary['accuracy_percentage']:<10.1f}% {eval_summary['hallucination_rate']:<12.1f}%")
+        print(_COMPARISON_ROW_FMT.format(
+            name=agent_name,
+            grade=grading_report['overall_grade'],
+            score=grading_report['overall_score'],
+            accuracy=eval_summary['accuracy_percentage'],
+            hallucination=eval_summary['hallucination_rate']
+        ))
     
     return comparison_results
 
@@ -8,9 +8,18 @@ import sys
 import os
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -19,13 +28,22 @@ from eval import TokenAnalyticsEvaluator
 # Load environment variables
 load_dotenv()
 
+# One pooled session for all API calls so connections (and TLS handshakes) are reused
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    # Connect errors and throttling statuses only: read=False re-raises a read timeout as
+    # requests' Timeout for the loops below instead of silently re-sending a billed completion
+    max_retries=Retry(total=3, read=False, backoff_factor=0.5, status_forcelist=[429, 502, 503],
+                      allowed_methods=frozenset({"POST"}), raise_on_status=False)
+))
+_session.headers.update({"Content-Type": "application/json"})
+
 def get_perplexity_response(question, api_key):
     """Get response from Perplexity AI"""
     try:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        headers = {"Authorization": f"Bearer {api_key}"}
         
         data = {
             "model": "sonar-pro",
@@ -45,7 +63,7 @@ def get_perplexity_response(question, api_key):
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.post(
+                response = _session.post(
                     "https://api.perplexity.ai/chat/completions",
                     headers=headers,
                     json=data,
@@ -74,10 +92,7 @@ def get_perplexity_response(question, api_key):
 def get_chatgpt_response(question, api_key):
     """Get response from ChatGPT"""
     try:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        headers = {"Authorization": f"Bearer {api_key}"}
         
         data = {
             "model": "gpt-4o",
@@ -98,7 +113,7 @@ def get_chatgpt_response(question, api_key):
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.post(
+                response = _session.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers=headers,
                     json=data,
@@ -124,6 +139,54 @@ def get_chatgpt_response(question, api_key):
         print(f"Error calling ChatGPT API: {e}")
         return f"Error: {str(e)}"
 
+class RateLimiter:
+    """Spaces out request starts across threads to stay under a provider's QPS limit"""
+    
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+    
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+def collect_responses(queries, get_response, api_key, max_workers=5, requests_per_second=2):
+    """Fetch responses for all queries concurrently, rate limited, keyed by query id in query order"""
+    limiter = RateLimiter(requests_per_second)
+    
+    def fetch(question):
+        limiter.wait()
+        return get_response(question, api_key)
+    
+    responses = {query['id']: None for query in queries}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, query['question']): query for query in queries}
+        for i, future in enumerate(as_completed(futures), 1):
+            query = futures[future]
+            query_id = query['id']
+            response = future.result()
+            responses[query_id] = response
+            
+            print(f"[{i:2d}/{len(queries)}] {query_id}: {query['question'][:60]}...")
+            # Show response preview
+            print(f"    Response: {response[:80]}...")
+            print()
+    return responses
+
+def save_raw_responses(responses, path):
+    """Write raw responses as indented JSON bytes, using orjson when available"""
+    if orjson is not None:
+        payload = orjson.dumps(responses, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(responses, ensure_ascii=False, indent=2).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(payload)
+
 def run_perplexity_evaluation(api_key):
     """Run complete evaluation for Perplexity"""
     print("PERPLEXITY AI EVALUATION")
@@ -139,29 +202,12 @@ def run_perplexity_evaluation(api_key):
     print("Collecting responses from Perplexity...")
     print()
     
-    # Collect responses
-    responses = {}
-    for i, query in enumerate(queries, 1):
-        question = query['question']
-        query_id = query['id']
-        
-        print(f"[{i:2d}/{len(queries)}] {query_id}: {question[:60]}...")
-        
-        # Get response from Perplexity
-        response = get_perplexity_response(question, api_key)
-        responses[query_id] = response
-        
-        # Show response preview
-        print(f"    Response: {response[:80]}...")
-        print()
-        
-        # Rate limiting - be respectful to APIs
-        time.sleep(3)
+    # Collect responses (concurrent, rate limited to be respectful to APIs)
+    responses = collect_responses(queries, get_perplexity_response, api_key)
     
     # Save raw responses
     print("Saving raw responses...")
-    with open("test/perplexity_raw_responses.json", 'w') as f:
-        json.dump(responses, f, indent=2)
+    save_raw_responses(responses, "test/perplexity_raw_responses.json")
     
     # Run evaluation
     print("Running evaluation...")
@@ -194,29 +240,12 @@ def run_chatgpt_evaluation(api_key):
     print("Collecting responses from ChatGPT...")
     print()
     
-    # Collect responses
-    responses = {}
-    for i, query in enumerate(queries, 1):
-        question = query['question']
-        query_id = query['id']
-        
-        print(f"[{i:2d}/{len(queries)}] {query_id}: {question[:60]}...")
-        
-        # Get response from ChatGPT
-        response = get_chatgpt_response(question, api_key)
-        responses[query_id] = response
-        
-        # Show response preview
-        print(f"    Response: {response[:80]}...")
-        print()
-        
-        # Rate limiting - be respectful to APIs
-        time.sleep(3)
+    # Collect responses (concurrent, rate limited to be respectful to APIs)
+    responses = collect_responses(queries, get_chatgpt_response, api_key)
     
     # Save raw responses
     print("Saving raw responses...")
-    with open("test/chatgpt_raw_responses.json", 'w') as f:
-        json.dump(responses, f, indent=2)
+    save_raw_responses(responses, "test/chatgpt_raw_responses.json")
     
     # Run evaluation
     print("Running evaluation...")
@@ -254,7 +283,7 @@ def main():
         return
     
     try:
-        # Run Perplexity evaluation
+        # Run Perplexity evaluation (each run already fetches its queries concurrently)
         print("\n" + "=" * 60)
         perplexity_summary = run_perplexity_evaluation(perplexity_key)
         
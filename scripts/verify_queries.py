@@ -4,25 +4,45 @@ Verify Queries Against Available Data
 Checks that all queries in queries.yaml can be answered with the available data
 """
 
+import os
+import re
+import sys
 import yaml
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from typing import Dict, List, Any
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Share the daily-data reader (Parquet copy with CSV fallback) with the truth calculator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dynamic_data_generation'))
+from dynamic_truth_calculator import read_daily_csv
+
+# Problem patterns, compiled once; case-insensitive so questions are never lowercased
+_INTRADAY_RE = re.compile(r'intraday|high[- ]low', re.I)
+_FUTURE_RE = re.compile(r'july|2025.*june|june.*2025', re.I | re.S)
+_RANGE_RE = re.compile(r'june 9 to july 8', re.I)
+_VOLUME_RE = re.compile(r'volume', re.I)
+_TOKEN_RE = re.compile(r'sol|eth|tao', re.I)
+
+# Data window the "June 9 to July 8" questions assume
+_RANGE_START = pd.Timestamp('2025-06-09')
+_RANGE_END = pd.Timestamp('2025-07-08')
+
 def load_data():
     """Load all token data"""
-    eth = pd.read_csv('data/eth_daily.csv')
-    sol = pd.read_csv('data/sol_daily.csv')
-    tao = pd.read_csv('data/tao_daily.csv')
-    
-    # Convert date column
-    for df in [eth, sol, tao]:
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
+    eth, sol, tao = [read_daily_csv(f'data/{token}_daily.csv') for token in ('eth', 'sol', 'tao')]
     
     return eth, sol, tao
 
+def _flat(df: pd.DataFrame) -> bool:
+    """True when a token has no intraday range (high equals low on every day)"""
+    return np.array_equal(df['high'].to_numpy(), df['low'].to_numpy())
+
 def verify_queries():
     """Verify all queries against available data"""
     print("🔍 VERIFYING QUERIES AGAINST AVAILABLE DATA")
@@ -33,7 +53,7 @@ def verify_queries():
     
     # Load queries
     with open('data/queries.yaml', 'r') as f:
-        queries_data = yaml.safe_load(f)
+        queries_data = yaml.load(f, Loader=SafeLoader)
     
     queries = queries_data['queries']
     
@@ -47,18 +67,15 @@ def verify_queries():
     print("🔍 Data Quality Issues:")
     
     # Check for intraday variation
-    eth_no_intraday = (eth['high'] == eth['low']).all()
-    sol_no_intraday = (sol['high'] == sol['low']).all()
-    tao_no_intraday = (tao['high'] == tao['low']).all()
-    
-    if eth_no_intraday and sol_no_intraday and tao_no_intraday:
+    if all(_flat(df) for df in (eth, sol, tao)):
         print("   ⚠️  No intraday variation: high=low=close for all tokens")
         print("   📝 Questions requiring intraday data will need modification")
     
     # Check for missing data
     for token, df in [('ETH', eth), ('SOL', sol), ('TAO', tao)]:
-        missing_days = df.isnull().sum()
-        if missing_days.any():
+        # Cheap whole-frame scan first; per-column counts only when something is missing
+        if df.isnull().values.any():
+            missing_days = df.isnull().sum()
             print(f"   ⚠️  {token} has missing data: {missing_days.to_dict()}")
     
     print()
@@ -67,39 +84,42 @@ def verify_queries():
     print("📋 Query Verification:")
     issues = []
     
-    for query in queries:
+    # Run each pattern as one vectorized string kernel over all questions
+    questions = pd.Series([query['question'] for query in queries], dtype=object)
+    intraday_mask = questions.str.contains(_INTRADAY_RE)
+    future_mask = questions.str.contains(_FUTURE_RE)
+    range_mask = questions.str.contains('30-day period', regex=False) & questions.str.contains(_RANGE_RE)
+    volume_mask = questions.str.contains(_VOLUME_RE) & questions.str.contains(_TOKEN_RE)
+    # The schema is the same for every query, so check for volume data once
+    has_volume = all('volume' in df.columns for df in (eth, sol, tao))
+    
+    for query, intraday, future, date_range, volume in zip(queries, intraday_mask, future_mask, range_mask, volume_mask):
         query_id = query['id']
-        question = query['question']
         category = query['category']
-        truth = query['truth']
         
         # Check for problematic patterns
         problems = []
         
         # Check for intraday references
-        if any(term in question.lower() for term in ['intraday', 'high-low', 'high low', 'high-low swing']):
+        if intraday:
             problems.append("References intraday data (not available)")
         
         # Check for future date references
-        if '2025' in question and 'june' in question.lower() or 'july' in question.lower():
+        if future:
             problems.append("References future dates (may confuse LLMs)")
         
         # Check for specific date ranges that might not match data
-        if '30-day period' in question and 'june 9 to july 8' in question.lower():
+        if date_range:
             # Verify this matches our data
-            start_date = pd.to_datetime('2025-06-09')
-            end_date = pd.to_datetime('2025-07-08')
             data_start = eth.index.min()
             data_end = eth.index.max()
             
-            if data_start != start_date or data_end != end_date:
+            if data_start != _RANGE_START or data_end != _RANGE_END:
                 problems.append(f"Date range mismatch: data is {data_start} to {data_end}")
         
         # Check for volume-related questions
-        if 'volume' in question.lower() and any(token in question.upper() for token in ['SOL', 'ETH', 'TAO']):
-            # Verify volume data exists
-            if 'volume' not in eth.columns or 'volume' not in sol.columns or 'volume' not in tao.columns:
-                problems.append("Volume data required but may be missing")
+        if volume and not has_volume:
+            problems.append("Volume data required but may be missing")
         
         if problems:
             issues.append({
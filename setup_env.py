@@ -5,7 +5,6 @@ Helps you create a .env file with your API keys
 """
 
 import os
-import shutil
 
 def setup_env_file():
     """
@@ -24,6 +23,7 @@ def setup_env_file():
     
     # Copy template
     if os.path.exists('env_example.txt'):
+        import shutil
         shutil.copy('env_example.txt', '.env')
         print("✅ Created .env file from template")
     else:
@@ -34,23 +34,22 @@ def setup_env_file():
     print("\n🔑 Enter your API keys (press Enter to skip):")
     print("-" * 40)
     
-    # Perplexity API key
-    perplexity_key = input("Perplexity API key (starts with pplx-): ").strip()
-    if perplexity_key:
-        update_env_file('PERPLEXITY_API_KEY', perplexity_key)
-        print("✅ Perplexity API key saved")
-    
-    # OpenAI API key
-    openai_key = input("OpenAI API key (starts with sk-): ").strip()
-    if openai_key:
-        update_env_file('OPENAI_API_KEY', openai_key)
-        print("✅ OpenAI API key saved")
-    
-    # Anthropic API key
-    anthropic_key = input("Anthropic API key (starts with sk-ant-): ").strip()
-    if anthropic_key:
-        update_env_file('ANTHROPIC_API_KEY', anthropic_key)
-        print("✅ Anthropic API key saved")
+    # Collect every key first so .env is rewritten only once
+    prompts = [
+        ('PERPLEXITY_API_KEY', 'Perplexity', "Perplexity API key (starts with pplx-): "),
+        ('OPENAI_API_KEY', 'OpenAI', "OpenAI API key (starts with sk-): "),
+        ('ANTHROPIC_API_KEY', 'Anthropic', "Anthropic API key (starts with sk-ant-): "),
+    ]
+    updates = {}
+    for key, name, prompt in prompts:
+        value = input(prompt).strip()
+        if value:
+            updates[key] = value
+    
+    update_env_file_bulk(updates)
+    for key, name, _ in prompts:
+        if key in updates:
+            print(f"✅ {name} API key saved")
     
     print("\n🎉 Environment setup complete!")
     print("You can now run the evaluation scripts without entering API keys each time.")
@@ -59,28 +58,33 @@ def update_env_file(key, value):
     """
     Update a specific key in .env file
     """
-    if not os.path.exists('.env'):
+    update_env_file_bulk({key: value})
+
+def update_env_file_bulk(updates):
+    """
+    Update several keys in .env file with a single read and write
+    """
+    if not updates or not os.path.exists('.env'):
         return
     
     # Read current .env file
     with open('.env', 'r') as f:
         lines = f.readlines()
     
-    # Update the specific key
-    updated = False
+    # Update the first line for each key
+    seen = set()
     for i, line in enumerate(lines):
-        if line.startswith(f'{key}='):
-            lines[i] = f'{key}={value}\n'
-            updated = True
-            break
+        key = line.split('=', 1)[0]
+        if '=' in line and key in updates and key not in seen:
+            lines[i] = f'{key}={updates[key]}\n'
+            seen.add(key)
     
-    # If key wasn't found, add it
-    if not updated:
-        lines.append(f'{key}={value}\n')
+    # Add any keys that weren't found
+    lines.extend(f'{key}={value}\n' for key, value in updates.items() if key not in seen)
     
     # Write back to file
     with open('.env', 'w') as f:
-        f.writelines(lines)
+        f.write(''.join(lines))
 
 def check_env_setup():
     """
@@ -0,0 +1,67 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Stop waiting (and cancel) well before the 24h completion window runs out
+_DEFAULT_MAX_WAIT = 2 * 60 * 60  # seconds
+_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def run_batch(client, requests: List[Dict[str, Any]], filename: str,
+              max_wait: float = _DEFAULT_MAX_WAIT, poll_interval: int = 30) -> Dict[str, Dict[str, Any]]:
+    """
+    Run chat-completion requests as one OpenAI Batch API job and return the output records by custom_id
+
+    Each request needs a custom_id and a chat-completions body. Blocks until the job finishes; raises
+    RuntimeError if it fails or outlives max_wait. The job is cancelled on timeout or Ctrl-C so it
+    does not keep running (and billing) unattended.
+    """
+    lines = [
+        json.dumps({
+            "custom_id": request["custom_id"],
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": request["body"]
+        })
+        for request in requests
+    ]
+    input_file = client.files.create(file=(filename, "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"📤 Submitted batch {batch.id} with {len(lines)} requests")
+
+    deadline = time.monotonic() + max_wait
+    try:
+        while batch.status not in _FINAL_STATUSES:
+            if time.monotonic() >= deadline:
+                client.batches.cancel(batch.id)
+                raise RuntimeError(f"Batch {batch.id} still {batch.status} after {max_wait:.0f}s; cancelled")
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+            print(f"   ⏳ Batch status: {batch.status}")
+    except KeyboardInterrupt:
+        print(f"\n⏹️  Cancelling batch {batch.id}")
+        client.batches.cancel(batch.id)
+        raise
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+    records = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if line.strip():
+            record = json.loads(line)
+            records[record["custom_id"]] = record
+    return records
+
+
+def record_content(record: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """(message content, None) for a successful output record, else (None, error message)"""
+    response = (record or {}).get("response") or {}
+    if response.get("status_code") != 200:
+        error = (record or {}).get("error") or response.get("body", {}).get("error") or "No result in batch output"
+        return None, str(error)
+    return response["body"]["choices"][0]["message"]["content"], None
@@ -0,0 +1,203 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from response_cache import get_cached_response, store_response
+from rate_limit import AdaptiveLimiter
+
+# Status codes worth retrying with backoff in the concurrent path
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_SYSTEM_PROMPT = "You are a financial data analyst. Answer questions about cryptocurrency price data accurately and concisely. Provide specific numbers and percentages when asked."
+
+
+class ChatCompletionClient:
+    """
+    Cached, rate-limited chat-completions calls for one OpenAI-compatible provider
+
+    The provider config is its display name, endpoint URL, model, Langfuse span name and any extra
+    body fields (e.g. temperature). Every call reuses one pooled session and one AdaptiveLimiter.
+    """
+
+    def __init__(self, name: str, url: str, model: str, span_name: str, langfuse,
+                 extra_body: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.span_name = span_name
+        self.langfuse = langfuse
+        self.extra_body = extra_body or {}
+        # Serve repeat questions from the on-disk response cache (disable with --no-cache)
+        self.use_cache = True
+        # Paces requests from the API's own x-ratelimit-* headers instead of a fixed sleep
+        self.limiter = AdaptiveLimiter()
+
+        # One pooled keep-alive session for every call, so the TLS handshake happens once
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            # Connect errors and retry statuses only; never re-send a completion that timed out mid-read
+            max_retries=Retry(total=3, read=False, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                              allowed_methods=frozenset({"POST"}), raise_on_status=False)
+        ))
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def request(self, question: str, api_key: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Build the headers and body for one call"""
+        headers = {
+            "Authorization": f"Bearer {api_key}"
+        }
+
+        data = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": _SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": question
+                }
+            ],
+            **self.extra_body
+        }
+        return headers, data
+
+    def cached_response(self, data: Dict[str, Any]) -> Optional[str]:
+        """Cached answer for this request body, unless caching is off"""
+        return get_cached_response(data) if self.use_cache else None
+
+    def store(self, data: Dict[str, Any], content: str):
+        """Cache a successful answer, unless caching is off"""
+        if self.use_cache:
+            store_response(data, content)
+
+    def get_response(self, question: str, api_key: str) -> str:
+        """Get one response over the pooled session"""
+        try:
+            headers, data = self.request(question, api_key)
+            cached = self.cached_response(data)
+            if cached is not None:
+                return cached
+
+            self.limiter.acquire()
+            response = self.session.post(self.url, headers=headers, json=data, timeout=30)
+            self.limiter.update(response.headers)
+
+            if response.status_code == 200:
+                content = response.json()["choices"][0]["message"]["content"]
+                self.store(data, content)
+                return content
+            else:
+                print(f"API Error: {response.status_code} - {response.text}")
+                return f"Error: API returned {response.status_code}"
+
+        except Exception as e:
+            print(f"Error calling {self.name} API: {e}")
+            return f"Error: {str(e)}"
+
+    async def get_response_async(self, client, question: str, api_key: str, max_retries: int = 3) -> str:
+        """Get one response over a shared async client, backing off on 429/5xx"""
+        retry_delay = 1  # seconds
+        try:
+            headers, data = self.request(question, api_key)
+            cached = self.cached_response(data)
+            if cached is not None:
+                return cached
+
+            for attempt in range(max_retries):
+                delay = self.limiter.wait_time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                response = await client.post(self.url, headers=headers, json=data)
+                self.limiter.update(response.headers)
+
+                if response.status_code in _RETRY_STATUSES and attempt < max_retries - 1:
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2  # Exponential backoff
+                    continue
+
+                if response.status_code == 200:
+                    content = response.json()["choices"][0]["message"]["content"]
+                    self.store(data, content)
+                    return content
+                print(f"API Error: {response.status_code} - {response.text}")
+                return f"Error: API returned {response.status_code}"
+
+        except Exception as e:
+            print(f"Error calling {self.name} API: {e}")
+            return f"Error: {str(e)}"
+
+    def _trace_span(self, query_id: str, question: str):
+        """Langfuse span for one call"""
+        return self.langfuse.start_as_current_span(
+            name=self.span_name,
+            metadata={
+                "query_id": query_id,
+                "question": question,
+                "llm_model": self.model,
+                "langfuse_name": self.span_name
+            }
+        )
+
+    def collect_responses(self, queries: List[Dict[str, Any]], api_key: str) -> Dict[str, str]:
+        """Fetch responses one at a time (used when httpx is not installed)"""
+        responses = {}
+        for i, query in enumerate(queries, 1):
+            question = query['question']
+            query_id = query['id']
+
+            print(f"[{i:2d}/{len(queries)}] {query_id}: {question[:60]}...")
+
+            # Langfuse tracing for each LLM call
+            with self._trace_span(query_id, question):
+                response = self.get_response(question, api_key)
+                responses[query_id] = response
+                # Log the response as a score (optional)
+                self.langfuse.score_current_trace(name="llm_response", value=1.0, comment=response)
+
+            # Show response preview
+            print(f"    Response: {response[:80]}...")
+            print()
+        return responses
+
+    async def collect_responses_async(self, queries: List[Dict[str, Any]], api_key: str,
+                                      max_concurrency: int = 10) -> Dict[str, str]:
+        """Fetch all responses concurrently, keyed by query id in query order"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(client, i, query):
+            question = query['question']
+            query_id = query['id']
+            async with semaphore:
+                # Langfuse tracing for each LLM call
+                with self._trace_span(query_id, question):
+                    response = await self.get_response_async(client, question, api_key)
+                    # Log the response as a score (optional)
+                    self.langfuse.score_current_trace(name="llm_response", value=1.0, comment=response)
+
+            # Show response preview
+            print(f"[{i:2d}/{len(queries)}] {query_id}: {question[:60]}...")
+            print(f"    Response: {response[:80]}...")
+            print()
+            return query_id, response
+
+        async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=20)) as client:
+            results = await asyncio.gather(*[fetch(client, i, query) for i, query in enumerate(queries, 1)])
+        return dict(results)
+
+    def collect(self, queries: List[Dict[str, Any]], api_key: str) -> Dict[str, str]:
+        """Collect responses concurrently when httpx is available, otherwise one at a time"""
+        if httpx is not None:
+            return asyncio.run(self.collect_responses_async(queries, api_key))
+        return self.collect_responses(queries, api_key)
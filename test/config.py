@@ -1,13 +1,17 @@
+from functools import lru_cache
 from types import MappingProxyType
 import yaml
 
-def read_config(path: str) -> dict:
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Results are immutable, so repeat reads of the same path can share them
+@lru_cache(maxsize=1)
+def read_config(path: str) -> tuple:
     with open(path, "r") as file:
-        config = yaml.safe_load(file)
+        config = yaml.load(file, Loader=SafeLoader)
     agents_id_map = MappingProxyType({agent["name"]: agent["id"] for agent in config['agents']})
-    query_tags = set(config['tags'])
-    return [
-        agents_id_map,
-        query_tags,
-    ]
-    
\ No newline at end of file
+    query_tags = frozenset(config['tags'])
+    return agents_id_map, query_tags
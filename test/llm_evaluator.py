@@ -8,8 +8,10 @@ import os
 import sys
 import json
 import csv
-import time
-from typing import Dict, List, Any
+import hashlib
+import tempfile
+from collections import Counter
+from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,33 +24,37 @@ except ImportError:
     print("❌ OpenAI not installed. Run: pip install openai")
     sys.exit(1)
 
-class LLMEvaluator:
-    def __init__(self, model="gpt-4o-mini"):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = model
-        
-    def evaluate_response(self, question: str, agent_response: str, expected_answer: Any, question_id: str) -> Dict[str, Any]:
-        """
-        Evaluate an agent response against the expected answer using LLM
-        """
-        
-        # Format expected answer for LLM
-        if isinstance(expected_answer, list):
-            expected_str = f"List: {expected_answer}"
-        elif isinstance(expected_answer, (int, float)):
-            expected_str = f"Number: {expected_answer}"
-        else:
-            expected_str = f"Text: {expected_answer}"
-        
-        prompt = f"""
-You are an expert evaluator comparing a crypto analytics agent's response against the correct answer.
-
-QUESTION: {question}
+from batch_api import run_batch, record_content
 
-AGENT'S RESPONSE:
-{agent_response}
+# Strict structured output: the API guarantees a verdict object matching this schema
+_EVALUATION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "evaluation",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "correctness": {"type": "string", "enum": ["Yes", "No", "Partial"]},
+                "confidence": {"type": "string", "enum": ["High", "Medium", "Low"]},
+                "reasoning": {"type": "string"},
+                "issues": {"type": "array", "items": {"type": "string"}},
+                "extracted_answer": {"type": "string"},
+                "comparison": {"type": "string"},
+                "quality_score": {"type": "integer", "minimum": 1, "maximum": 10},
+                "detailed_analysis": {"type": "string"}
+            },
+            "required": [
+                "correctness", "confidence", "reasoning", "issues",
+                "extracted_answer", "comparison", "quality_score", "detailed_analysis"
+            ],
+            "additionalProperties": False
+        }
+    }
+}
 
-EXPECTED ANSWER: {expected_str}
+# Static grading instructions, sent as an identical system message on every request
+_SYSTEM_PROMPT = """You are an expert evaluator comparing a crypto analytics agent's response against the correct answer.
 
 Please evaluate the agent's response and provide:
 
@@ -61,7 +67,7 @@ Please evaluate the agent's response and provide:
 7. **QUALITY**: Rate the overall quality of the response (1-10)
 
 Respond in JSON format:
-{{
+{
     "correctness": "Yes/No/Partial",
     "confidence": "High/Medium/Low", 
     "reasoning": "detailed explanation",
@@ -70,78 +76,231 @@ Respond in JSON format:
     "comparison": "how it compares to expected",
     "quality_score": 1-10,
     "detailed_analysis": "comprehensive breakdown"
-}}
+}
+"""
+
+# Per-question part of the prompt, filled with format_map
+_PROMPT_TEMPLATE = """QUESTION: {question}
+
+AGENT'S RESPONSE:
+{agent_response}
+
+EXPECTED ANSWER: {expected_str}
 """
+
+class LLMEvaluator:
+    def __init__(self, model="gpt-4o-mini", cache_dir="test/.llm_eval_cache"):
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = model
+        # Finished evaluations keyed by a hash of (model, question, response, expected answer)
+        self.cache_dir = cache_dir
+    
+    def _cache_path(self, question: str, agent_response: str, expected_answer: Any) -> str:
+        """Cache file for one grading request"""
+        key = hashlib.sha256(f"{self.model}|{question}|{agent_response}|{expected_answer}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def _load_cached(self, question: str, agent_response: str, expected_answer: Any) -> Optional[Dict[str, Any]]:
+        """Return a previously stored evaluation for this request, if any"""
+        cache_path = self._cache_path(question, agent_response, expected_answer)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # Unreadable or truncated entry; treat as a miss and let _store overwrite it
+    
+    def _store(self, evaluation: Dict[str, Any]):
+        """Persist a successfully parsed evaluation so re-runs skip the LLM call"""
+        if evaluation.get("correctness") == "Error" or evaluation.get("parse_failed"):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self._cache_path(evaluation["question"], evaluation["agent_response"], evaluation["expected_answer"])
+        # Write to a temp file and rename, so an interrupted run never leaves a half-written entry
+        with tempfile.NamedTemporaryFile("w", dir=self.cache_dir, suffix=".tmp", delete=False) as f:
+            json.dump(evaluation, f)
+        os.replace(f.name, cache_path)
+        
+    def _build_prompt(self, question: str, agent_response: str, expected_answer: Any) -> str:
+        """Build the per-question part of the grading prompt"""
+        # Format expected answer for LLM
+        if isinstance(expected_answer, list):
+            expected_str = f"List: {expected_answer}"
+        elif isinstance(expected_answer, (int, float)):
+            expected_str = f"Number: {expected_answer}"
+        else:
+            expected_str = f"Text: {expected_answer}"
+        
+        return _PROMPT_TEMPLATE.format_map({
+            "question": question,
+            "agent_response": agent_response,
+            "expected_str": expected_str
+        })
+    
+    def _request_body(self, question: str, agent_response: str, expected_answer: Any) -> Dict[str, Any]:
+        """Chat completion parameters shared by the direct and batch paths"""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": self._build_prompt(question, agent_response, expected_answer)}
+            ],
+            "temperature": 0.1,
+            "max_tokens": 1000,
+            "response_format": _EVALUATION_RESPONSE_FORMAT
+        }
+    
+    def _parse_evaluation(self, content: str, question: str, agent_response: str,
+                          expected_answer: Any, question_id: str) -> Dict[str, Any]:
+        """Parse the LLM's JSON verdict and attach the question metadata"""
+        try:
+            evaluation = json.loads(content)
+        except (json.JSONDecodeError, TypeError):
+            # Only reachable when the reply was cut off at max_tokens or refused (content is None)
+            evaluation = {
+                "correctness": "Unknown",
+                "confidence": "Low",
+                "expected_extraction": "Could not determine",
+                "actual_extraction": "Could not extract",
+                "reasoning": "Failed to parse LLM response",
+                "issues": ["JSON parsing error"],
+                "comparison": "Could not compare",
+                "quality_score": 0,
+                "what_was_missing": "Could not determine",
+                "what_was_wrong": "Could not determine",
+                "detailed_analysis": content,
+                # Marks this fallback so _store never caches it
+                "parse_failed": True
+            }
+        
+        # Add metadata
+        evaluation["question_id"] = question_id
+        evaluation["question"] = question
+        evaluation["expected_answer"] = expected_answer
+        evaluation["agent_response"] = agent_response
+        
+        return evaluation
+    
+    def _error_evaluation(self, message: str, question: str, agent_response: str,
+                          expected_answer: Any, question_id: str) -> Dict[str, Any]:
+        """Evaluation record for a question whose LLM call failed"""
+        return {
+            "question_id": question_id,
+            "question": question,
+            "expected_answer": expected_answer,
+            "agent_response": agent_response,
+            "correctness": "Error",
+            "confidence": "Low",
+            "reasoning": f"Evaluation failed: {message}",
+            "issues": [f"LLM evaluation error: {message}"],
+            "extracted_answer": "Could not evaluate",
+            "comparison": "Could not compare",
+            "quality_score": 0,
+            "detailed_analysis": f"Error during evaluation: {message}"
+        }
+    
+    def evaluate_response(self, question: str, agent_response: str, expected_answer: Any, question_id: str) -> Dict[str, Any]:
+        """
+        Evaluate an agent response against the expected answer using LLM
+        """
+        cached = self._load_cached(question, agent_response, expected_answer)
+        if cached is not None:
+            cached["question_id"] = question_id
+            return cached
         
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=1000
+                **self._request_body(question, agent_response, expected_answer)
             )
             
-            # Parse JSON response
             content = response.choices[0].message.content
-            try:
-                evaluation = json.loads(content)
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                evaluation = {
-                    "correctness": "Unknown",
-                    "confidence": "Low",
-                    "expected_extraction": "Could not determine",
-                    "actual_extraction": "Could not extract",
-                    "reasoning": "Failed to parse LLM response",
-                    "issues": ["JSON parsing error"],
-                    "comparison": "Could not compare",
-                    "quality_score": 0,
-                    "what_was_missing": "Could not determine",
-                    "what_was_wrong": "Could not determine",
-                    "detailed_analysis": content
-                }
-            
-            # Add metadata
-            evaluation["question_id"] = question_id
-            evaluation["question"] = question
-            evaluation["expected_answer"] = expected_answer
-            evaluation["agent_response"] = agent_response
-            
+            evaluation = self._parse_evaluation(content, question, agent_response, expected_answer, question_id)
+            self._store(evaluation)
             return evaluation
             
         except Exception as e:
-            return {
-                "question_id": question_id,
-                "question": question,
-                "expected_answer": expected_answer,
-                "agent_response": agent_response,
-                "correctness": "Error",
-                "confidence": "Low",
-                "reasoning": f"Evaluation failed: {str(e)}",
-                "issues": [f"LLM evaluation error: {str(e)}"],
-                "extracted_answer": "Could not evaluate",
-                "comparison": "Could not compare",
-                "quality_score": 0,
-                "detailed_analysis": f"Error during evaluation: {str(e)}"
-            }
+            return self._error_evaluation(str(e), question, agent_response, expected_answer, question_id)
+    
+    def evaluate_batch(self, items: List[Dict[str, Any]], poll_interval: int = 30) -> List[Dict[str, Any]]:
+        """
+        Evaluate many responses as one OpenAI Batch API job
+        
+        Each item needs question_id, question, agent_response and expected_answer.
+        Blocks until the batch finishes; results come back in the order of items.
+        """
+        # Serve already-graded requests from the cache; only the misses go to the batch
+        cached = {}
+        for item in items:
+            evaluation = self._load_cached(item["question"], item["agent_response"], item["expected_answer"])
+            if evaluation is not None:
+                evaluation["question_id"] = item["question_id"]
+                cached[item["question_id"]] = evaluation
+        if cached:
+            print(f"📦 {len(cached)} evaluations served from cache")
+        pending = [item for item in items if item["question_id"] not in cached]
+        if not pending:
+            return [cached[item["question_id"]] for item in items]
+        
+        def fail_all(message):
+            return [
+                cached.get(item["question_id"]) or self._error_evaluation(
+                    message, item["question"], item["agent_response"], item["expected_answer"], item["question_id"])
+                for item in items
+            ]
+        
+        try:
+            records = run_batch(
+                self.client,
+                [
+                    {
+                        "custom_id": item["question_id"],
+                        "body": self._request_body(item["question"], item["agent_response"], item["expected_answer"])
+                    }
+                    for item in pending
+                ],
+                "llm_evaluation_batch.jsonl",
+                poll_interval=poll_interval
+            )
+        except Exception as e:
+            return fail_all(str(e))
+        
+        evaluations = []
+        for item in items:
+            if item["question_id"] in cached:
+                evaluations.append(cached[item["question_id"]])
+                continue
+            args = (item["question"], item["agent_response"], item["expected_answer"], item["question_id"])
+            content, error = record_content(records.get(item["question_id"]))
+            if content is None:
+                evaluations.append(self._error_evaluation(error, *args))
+                continue
+            evaluation = self._parse_evaluation(content, *args)
+            self._store(evaluation)
+            evaluations.append(evaluation)
+        
+        return evaluations
 
 def load_queries_and_truth():
     """Load queries and their expected answers"""
     import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
     
     with open("data/queries.yaml", "r") as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=SafeLoader)
     
-    queries = {}
-    for query in data['queries']:
-        queries[query['id']] = {
+    return {
+        query['id']: {
             'question': query['question'],
             'expected_answer': query['truth'],
             'explanation': query.get('explanation', ''),
             'category': query.get('category', '')
         }
-    
-    return queries
+        for query in data['queries']
+    }
 
 def load_agent_responses(csv_file: str) -> Dict[str, str]:
     """Load agent responses from CSV"""
@@ -168,55 +327,51 @@ def run_llm_evaluation():
     # Initialize evaluator
     evaluator = LLMEvaluator()
     
-    # Evaluate each response
-    evaluations = []
-    correct_count = 0
-    total_count = 0
+    # Evaluate every response in one batch job instead of one call per question
+    items = [
+        {
+            "question_id": question_id,
+            "question": queries[question_id]['question'],
+            "agent_response": response,
+            "expected_answer": queries[question_id]['expected_answer']
+        }
+        for question_id, response in agent_responses.items()
+        if question_id in queries
+    ]
     
-    print(f"🔄 Evaluating {len(agent_responses)} responses...")
+    print(f"🔄 Evaluating {len(items)} responses...")
+    evaluations = evaluator.evaluate_batch(items)
     
-    for question_id, response in agent_responses.items():
-        if question_id in queries:
-            question_data = queries[question_id]
-            
-            print(f"\n[{total_count + 1:2d}/{len(agent_responses)}] Evaluating: {question_id}")
-            print(f"Question: {question_data['question'][:80]}...")
-            
-            # Run LLM evaluation
-            evaluation = evaluator.evaluate_response(
-                question=question_data['question'],
-                agent_response=response,
-                expected_answer=question_data['expected_answer'],
-                question_id=question_id
-            )
-            
-            evaluations.append(evaluation)
-            
-            # Track statistics
-            total_count += 1
-            if evaluation['correctness'].lower() == 'yes':
-                correct_count += 1
-            
-            print(f"   Result: {evaluation['correctness']} (Confidence: {evaluation['confidence']})")
-            print(f"   Quality: {evaluation['quality_score']}/10")
-            
-            # Add delay to avoid rate limits
-            time.sleep(1)
+    # Summary aggregates are accumulated in the same pass that writes the results
+    correct_count = 0
+    total_count = len(evaluations)
+    correctness_counts = Counter()
+    quality_sum = 0.0
+    quality_n = 0
     
-    # Save detailed results
+    # evaluate_batch already cached each graded item (a rerun resumes from there); write both files in one loop
     print("\n💾 Saving evaluation results...")
-    
-    # Save as JSON
-    with open("test/llm_evaluation_results.json", "w") as f:
-        json.dump(evaluations, f, indent=2)
-    
-    # Save as CSV
     csv_fields = ['question_id', 'correctness', 'confidence', 'quality_score', 'reasoning', 'issues', 'extracted_answer', 'comparison']
-    with open("test/llm_evaluation_results.csv", "w", newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=csv_fields)
+    with open("test/llm_evaluation_results.jsonl", "w", encoding='utf-8') as jsonl_file, \
+         open("test/llm_evaluation_results.csv", "w", newline='', encoding='utf-8') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=csv_fields)
         writer.writeheader()
-        for eval in evaluations:
-            writer.writerow({k: eval.get(k, '') for k in csv_fields})
+        # Correct results are only counted; the rest get a line each
+        for evaluation in evaluations:
+            correctness = evaluation['correctness'].lower()
+            correctness_counts[correctness] += 1
+            if correctness == 'yes':
+                correct_count += 1
+            if isinstance(evaluation['quality_score'], (int, float)):
+                quality_sum += evaluation['quality_score']
+                quality_n += 1
+            
+            if correctness != 'yes':
+                print(f"   {evaluation['question_id']}: {evaluation['correctness']} "
+                      f"(Confidence: {evaluation['confidence']}, Quality: {evaluation['quality_score']}/10)")
+            
+            jsonl_file.write(json.dumps(evaluation) + "\n")
+            writer.writerow({k: evaluation.get(k, '') for k in csv_fields})
     
     # Print summary
     print("\n" + "=" * 60)
@@ -225,23 +380,17 @@ def run_llm_evaluation():
     print(f"✅ Correct Answers: {correct_count}/{total_count} ({correct_count/total_count*100:.1f}%)")
     
     # Breakdown by correctness
-    correctness_counts = {}
-    for eval in evaluations:
-        correctness = eval['correctness'].lower()
-        correctness_counts[correctness] = correctness_counts.get(correctness, 0) + 1
-    
     print("\n📈 Breakdown by Correctness:")
     for correctness, count in correctness_counts.items():
         print(f"   {correctness.title()}: {count} ({count/total_count*100:.1f}%)")
     
     # Average quality score
-    quality_scores = [eval['quality_score'] for eval in evaluations if isinstance(eval['quality_score'], (int, float))]
-    if quality_scores:
-        avg_quality = sum(quality_scores) / len(quality_scores)
+    if quality_n:
+        avg_quality = quality_sum / quality_n
         print(f"\n📊 Average Quality Score: {avg_quality:.1f}/10")
     
     print(f"\n📄 Results saved to:")
-    print(f"   - test/llm_evaluation_results.json")
+    print(f"   - test/llm_evaluation_results.jsonl")
     print(f"   - test/llm_evaluation_results.csv")
     
     return evaluations
@@ -0,0 +1,73 @@
+import re
+import threading
+import time
+
+# OpenAI/Perplexity report reset windows as durations like "1s", "6m0s" or "20ms"
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def _parse_duration(value: str) -> float:
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in _DURATION_RE.findall(value))
+
+
+class AdaptiveLimiter:
+    """Request budget driven by x-ratelimit-* response headers; only waits once the server says the window is spent"""
+
+    def __init__(self):
+        self.remaining = None  # unknown until the first response
+        self.reset_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """Seconds to wait before the next request may be sent (0 in the common case)"""
+        with self.lock:
+            if self.remaining is None or self.remaining > 0:
+                if self.remaining:
+                    self.remaining -= 1
+                return 0.0
+            return max(0.0, self.reset_at - time.monotonic())
+
+    def acquire(self):
+        """Block until the current rate-limit window allows another request"""
+        delay = self.wait_time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def update(self, headers):
+        """Record the budget reported by a response (requests or httpx headers)"""
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = headers.get("x-ratelimit-reset-requests")
+        if remaining is None:
+            return
+        with self.lock:
+            self.remaining = int(remaining)
+            self.reset_at = time.monotonic() + (_parse_duration(reset) if reset else 1.0)
+
+
+class RateLimiter:
+    """Token buckets for requests/min and tokens/min, shared by all worker threads"""
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200000):
+        self.capacity = (float(requests_per_minute), float(tokens_per_minute))
+        self.available = list(self.capacity)
+        self.lock = threading.Lock()
+        self.last_refill = time.monotonic()
+
+    def acquire(self, tokens_estimate):
+        """Block until one request of about tokens_estimate tokens fits in both buckets"""
+        # A request larger than the whole TPM budget can only wait for a full bucket
+        needed = (1.0, min(float(tokens_estimate), self.capacity[1]))
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.last_refill
+                self.last_refill = now
+                for i, capacity in enumerate(self.capacity):
+                    self.available[i] = min(capacity, self.available[i] + elapsed * capacity / 60.0)
+                if all(self.available[i] >= needed[i] for i in range(2)):
+                    for i in range(2):
+                        self.available[i] -= needed[i]
+                    return
+                wait_time = max((needed[i] - self.available[i]) * 60.0 / self.capacity[i] for i in range(2))
+            time.sleep(wait_time)
@@ -0,0 +1,39 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+# Exact-match cache of LLM answers, one JSON file per (request parameters, system prompt, question)
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".response_cache")
+
+
+def _cache_path(data: dict) -> str:
+    messages = data["messages"]
+    system = "".join(m["content"] for m in messages if m["role"] == "system")
+    question = "".join(m["content"] for m in messages if m["role"] == "user")
+    system_hash = hashlib.sha256(system.encode("utf-8")).hexdigest()
+    # Every other body field (model, temperature, max_tokens, ...) changes the answer too
+    params = json.dumps({k: v for k, v in data.items() if k != "messages"}, sort_keys=True)
+    key = hashlib.sha256(f"{params}|{system_hash}|{question}".encode("utf-8")).hexdigest()
+    return os.path.join(_CACHE_DIR, f"{key}.json")
+
+
+def get_cached_response(data: dict) -> Optional[str]:
+    """Return the stored answer for this request body, if any"""
+    cache_path = _cache_path(data)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r") as f:
+            return json.load(f)["response"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None  # Unreadable or truncated entry; treat as a miss and let store_response overwrite it
+
+
+def store_response(data: dict, response: str):
+    """Persist a successful answer so re-runs skip the API call"""
+    if response.startswith("Error:"):
+        return
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    with open(_cache_path(data), "w") as f:
+        json.dump({"model": data["model"], "response": response}, f)
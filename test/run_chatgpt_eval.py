@@ -6,12 +6,18 @@ Simple script to evaluate ChatGPT with your API key
 
 import sys
 import os
+import argparse
 import json
-import time
-import requests
 from dotenv import load_dotenv
+
+try:
+    from openai import OpenAI
+except ImportError:
+    OpenAI = None
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from scripts.eval import TokenAnalyticsEvaluator
+from chat_client import ChatCompletionClient
+from batch_api import run_batch, record_content
 
 # Langfuse integration
 from langfuse import Langfuse
@@ -25,49 +31,56 @@ langfuse = Langfuse(
 # Load environment variables
 load_dotenv()
 
-def get_chatgpt_response(question, api_key):
+# Cached, rate-limited calls to the ChatGPT chat-completions endpoint
+_client = ChatCompletionClient(
+    "ChatGPT", "https://api.openai.com/v1/chat/completions", "gpt-4o", "GPT LLM Call", langfuse,
+    extra_body={"temperature": 0.1}
+)
+
+# Above this many queries, go through the Batch API (half price, separate rate-limit pool)
+_BATCH_THRESHOLD = 200
+
+def collect_responses_batch(queries, api_key, poll_interval=30):
     """
-    Get response from ChatGPT
+    Fetch ChatGPT responses through the OpenAI Batch API; blocks until the batch job finishes
     """
+    responses = {}
+    pending = []
+    for query in queries:
+        _, data = _client.request(query['question'], api_key)
+        cached = _client.cached_response(data)
+        if cached is not None:
+            responses[query['id']] = cached
+        else:
+            pending.append((query['id'], data))
+    if responses:
+        print(f"📦 {len(responses)} responses served from cache")
+    if not pending:
+        return {query['id']: responses[query['id']] for query in queries}
+    
     try:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "gpt-4o",
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": "You are a financial data analyst. Answer questions about cryptocurrency price data accurately and concisely. Provide specific numbers and percentages when asked."
-                },
-                {
-                    "role": "user", 
-                    "content": question
-                }
-            ],
-            "temperature": 0.1
-        }
-        
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
+        records = run_batch(
+            OpenAI(api_key=api_key),
+            [{"custom_id": query_id, "body": data} for query_id, data in pending],
+            "chatgpt_batch_input.jsonl",
+            poll_interval=poll_interval
         )
-        
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            print(f"API Error: {response.status_code} - {response.text}")
-            return f"Error: API returned {response.status_code}"
-            
     except Exception as e:
-        print(f"Error calling ChatGPT API: {e}")
-        return f"Error: {str(e)}"
+        print(f"Error running ChatGPT batch: {e}")
+        for query_id, _ in pending:
+            responses[query_id] = f"Error: {str(e)}"
+        return {query['id']: responses[query['id']] for query in queries}
+    
+    for query_id, data in pending:
+        content, error = record_content(records.get(query_id))
+        if content is None:
+            responses[query_id] = f"Error: {error}"
+            continue
+        _client.store(data, content)
+        responses[query_id] = content
+    return {query['id']: responses[query['id']] for query in queries}
 
-def run_chatgpt_evaluation(api_key):
+def run_chatgpt_evaluation(api_key, use_batch=False):
     """
     Run complete evaluation for ChatGPT
     """
@@ -84,36 +97,11 @@ def run_chatgpt_evaluation(api_key):
     print("🔄 Collecting responses from ChatGPT...")
     print()
     
-    # Collect responses
-    responses = {}
-    for i, query in enumerate(queries, 1):
-        question = query['question']
-        query_id = query['id']
-        
-        print(f"[{i:2d}/{len(queries)}] {query_id}: {question[:60]}...")
-        
-        # Langfuse tracing for each LLM call
-        with langfuse.start_as_current_span(
-            name="GPT LLM Call",
-            metadata={
-                "query_id": query_id,
-                "question": question,
-                "llm_model": "gpt-4o",
-                "langfuse_name": "GPT LLM Call"
-            }
-        ):
-            # Get response from ChatGPT
-            response = get_chatgpt_response(question, api_key)
-            responses[query_id] = response
-            # Log the response as a score (optional)
-            langfuse.score_current_trace(name="llm_response", value=1.0, comment=response)
-        
-        # Show response preview
-        print(f"    Response: {response[:80]}...")
-        print()
-        
-        # Rate limiting - be nice to the API
-        time.sleep(1)
+    # Large (or --batch) runs go through the Batch API when the openai SDK is installed; otherwise concurrently when httpx is available, else one at a time
+    if OpenAI is not None and (use_batch or len(queries) > _BATCH_THRESHOLD):
+        responses = collect_responses_batch(queries, api_key)
+    else:
+        responses = _client.collect(queries, api_key)
     
     # Save raw responses
     print("💾 Saving raw responses...")
@@ -140,6 +128,12 @@ def main():
     """
     Main function
     """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API instead of reusing cached answers")
+    parser.add_argument("--batch", action="store_true", help="Submit all queries as one OpenAI Batch API job (cheaper, not interactive)")
+    args = parser.parse_args()
+    _client.use_cache = not args.no_cache
+    
     print("🚀 ChatGPT Token Analytics Evaluation")
     print("=" * 60)
     
@@ -162,7 +156,7 @@ def main():
     
     try:
         # Run evaluation
-        summary = run_chatgpt_evaluation(api_key)
+        summary = run_chatgpt_evaluation(api_key, use_batch=args.batch)
         
         # Show final summary
         print("\n" + "🎉 EVALUATION COMPLETE!")
@@ -6,12 +6,12 @@ Simple script to evaluate Perplexity AI with your API key
 
 import sys
 import os
+import argparse
 import json
-import time
-import requests
 from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from scripts.eval import TokenAnalyticsEvaluator
+from chat_client import ChatCompletionClient
 
 # Langfuse integration
 from langfuse import Langfuse
@@ -24,46 +24,10 @@ langfuse = Langfuse(
     host=os.getenv("LANGFUSE_HOST", "https://us.cloud.langfuse.com")
 )
 
-def get_perplexity_response(question, api_key):
-    """
-    Get response from Perplexity AI
-    """
-    try:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "sonar-pro",
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": "You are a financial data analyst. Answer questions about cryptocurrency price data accurately and concisely. Provide specific numbers and percentages when asked."
-                },
-                {
-                    "role": "user", 
-                    "content": question
-                }
-            ]
-        }
-        
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            print(f"API Error: {response.status_code} - {response.text}")
-            return f"Error: API returned {response.status_code}"
-            
-    except Exception as e:
-        print(f"Error calling Perplexity API: {e}")
-        return f"Error: {str(e)}"
+# Cached, rate-limited calls to the Perplexity chat-completions endpoint
+_client = ChatCompletionClient(
+    "Perplexity", "https://api.perplexity.ai/chat/completions", "sonar-pro", "PPLX LLM Call", langfuse
+)
 
 def run_perplexity_evaluation(api_key):
     """
@@ -82,36 +46,8 @@ def run_perplexity_evaluation(api_key):
     print("🔄 Collecting responses from Perplexity...")
     print()
     
-    # Collect responses
-    responses = {}
-    for i, query in enumerate(queries, 1):
-        question = query['question']
-        query_id = query['id']
-        
-        print(f"[{i:2d}/{len(queries)}] {query_id}: {question[:60]}...")
-        
-        # Langfuse tracing for each Perplexity LLM call
-        with langfuse.start_as_current_span(
-            name="PPLX LLM Call",
-            metadata={
-                "query_id": query_id,
-                "question": question,
-                "llm_model": "sonar-pro",
-                "langfuse_name": "PPLX LLM Call"
-            }
-        ):
-            # Get response from Perplexity
-            response = get_perplexity_response(question, api_key)
-            responses[query_id] = response
-            # Log the response as a score (optional)
-            langfuse.score_current_trace(name="llm_response", value=1.0, comment=response)
-        
-        # Show response preview
-        print(f"    Response: {response[:80]}...")
-        print()
-        
-        # Rate limiting - be nice to the API
-        time.sleep(1)
+    # Collect responses concurrently when httpx is available, otherwise one at a time
+    responses = _client.collect(queries, api_key)
     
     # Save raw responses
     print("💾 Saving raw responses...")
@@ -138,6 +74,10 @@ def main():
     """
     Main function
     """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API instead of reusing cached answers")
+    _client.use_cache = not parser.parse_args().no_cache
+    
     print("🚀 Perplexity AI Token Analytics Evaluation")
     print("=" * 60)
     
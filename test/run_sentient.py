@@ -35,77 +35,76 @@ def run_sentient_evaluation():
     print("🔄 Collecting responses from Sentient agents...\n")
 
     responses = {}
-    csv_data = []
-    
-    for i, query in enumerate(queries, 1):
-        prompt_id = query['id']
-        question = query['question']
-
-        print(f"[{i:2d}/{len(queries)}] {prompt_id}: {question[:60]}...")
-
-        # Get a real chat ID for this question
-        try:
-            chat_id = get_chat_id()
-            print(f"    Chat ID: {chat_id}")
-        except Exception as e:
-            print(f"❌ Failed to get chat ID: {e}")
-            chat_id = f"fallback-chat-{prompt_id}"
-
-        # Use the real chat ID for all agents
-        chat_ids = [chat_id] * _NUM_AGENTS
-
-        try:
-            result = get_agent_responses(chat_ids, question, prompt_id, "0")
-            agent_answers = {agent: result[i][0] for i, agent in enumerate(_AGENTS.keys())}
-
-            # For this evaluation, choose one agent to evaluate (e.g., the first)
-            primary_agent = list(_AGENTS.keys())[0]
-            response_text = agent_answers[primary_agent]
-            responses[prompt_id] = response_text
-
-            # Log to CSV data
-            csv_data.append({
-                'prompt_id': prompt_id,
-                'question': question,
-                'chat_id': chat_id,
-                'agent': primary_agent,
-                'response': response_text,
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            })
-
-            print(f"    Response:\n{response_text}\n{'-'*40}\n")
-            time.sleep(1)
-
-        except Exception as e:
-            print(f"❌ Error during response collection: {e}")
-            responses[prompt_id] = "ERROR"
-            
-            # Log error to CSV
-            csv_data.append({
-                'prompt_id': prompt_id,
-                'question': question,
-                'chat_id': chat_id,
-                'agent': 'unknown',
-                'response': f"ERROR: {e}",
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            })
 
-    # Save responses to JSON
-    print("💾 Saving raw responses...")
+    # Write each row as soon as its query finishes so a crash mid-run keeps what was already collected
     os.makedirs("test", exist_ok=True)
-    with open("test/sentient_raw_responses.json", "w") as f:
-        json.dump(responses, f, indent=2)
-
-    # Save detailed results to CSV
     csv_filename = "test/sentient_responses.csv"
-    with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['prompt_id', 'question', 'chat_id', 'agent', 'response', 'timestamp']
+    fieldnames = ['prompt_id', 'question', 'chat_id', 'agent', 'response', 'timestamp']
+    with open(csv_filename, 'w', newline='', encoding='utf-8', buffering=1) as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(csv_data)
-    
+
+        for i, query in enumerate(queries, 1):
+            prompt_id = query['id']
+            question = query['question']
+
+            print(f"[{i:2d}/{len(queries)}] {prompt_id}: {question[:60]}...")
+
+            # Get a real chat ID for this question
+            try:
+                chat_id = get_chat_id()
+                print(f"    Chat ID: {chat_id}")
+            except Exception as e:
+                print(f"❌ Failed to get chat ID: {e}")
+                chat_id = f"fallback-chat-{prompt_id}"
+
+            # Use the real chat ID for all agents
+            chat_ids = [chat_id] * _NUM_AGENTS
+
+            try:
+                result = get_agent_responses(chat_ids, question, prompt_id, "0")
+                agent_answers = {agent: result[i][0] for i, agent in enumerate(_AGENTS.keys())}
+
+                # For this evaluation, choose one agent to evaluate (e.g., the first)
+                primary_agent = list(_AGENTS.keys())[0]
+                response_text = agent_answers[primary_agent]
+                responses[prompt_id] = response_text
+
+                # Log to CSV
+                writer.writerow({
+                    'prompt_id': prompt_id,
+                    'question': question,
+                    'chat_id': chat_id,
+                    'agent': primary_agent,
+                    'response': response_text,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                })
+
+                print(f"    Response:\n{response_text}\n{'-'*40}\n")
+                time.sleep(1)
+
+            except Exception as e:
+                print(f"❌ Error during response collection: {e}")
+                responses[prompt_id] = "ERROR"
+                
+                # Log error to CSV
+                writer.writerow({
+                    'prompt_id': prompt_id,
+                    'question': question,
+                    'chat_id': chat_id,
+                    'agent': 'unknown',
+                    'response': f"ERROR: {e}",
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                })
+            csvfile.flush()
+
     print(f"📄 Detailed results saved to: {csv_filename}")
 
+    # Save responses to JSON
+    print("💾 Saving raw responses...")
+    with open("test/sentient_raw_responses.json", "w") as f:
+        json.dump(responses, f, indent=2)
+
     print("📊 Running evaluation...")
     summary = evaluator.run_evaluation(responses, "Sentient LLM")
 
@@ -1,7 +1,8 @@
 import os
-import time
 import random
-import threading
+import asyncio
+
+import httpx
 
 from dotenv import load_dotenv
 from langfuse import Langfuse
@@ -23,66 +24,63 @@ langfuse = Langfuse(
     host="https://us.cloud.langfuse.com"
 )
 
-# Global response holders
-responses = [None] * _NUM_AGENTS
-threads = [None] * _NUM_AGENTS
 
+def _start_generation(prompt_span, agent_id, chat_id, prompt, prompt_id, prompt_subid, agent_name):
+    if not prompt_span:
+        return None
+    return prompt_span.start_generation(
+        name=f"agent-{agent_id}-prompt",
+        input=prompt,
+        metadata={
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "chat_id": chat_id,
+            "prompt_id": prompt_id,
+            "prompt_subid": prompt_subid
+        }
+    )
 
-def get_agent_response(i, agent_id, chat_id, prompt, prompt_span=None, prompt_id="", prompt_subid="", agent_name=""):
-    time.sleep(0.5)
-    generation = None
 
-    if prompt_span:
-        generation = prompt_span.start_generation(
-            name=f"agent-{agent_id}-prompt",
-            input=prompt,
-            metadata={
-                "agent_id": agent_id,
-                "agent_name": agent_name,
-                "chat_id": chat_id,
-                "prompt_id": prompt_id,
-                "prompt_subid": prompt_subid
-            }
-        )
+async def get_agent_response_async(http_client, agent_id, chat_id, prompt, prompt_span=None, prompt_id="", prompt_subid="", agent_name=""):
+    await asyncio.sleep(0.5)
+    generation = _start_generation(prompt_span, agent_id, chat_id, prompt, prompt_id, prompt_subid, agent_name)
 
     try:
-        response, ttfb = sse_api.get_response(chat_id, agent_id, prompt)
+        response, ttfb = await sse_api.get_response_async(chat_id, agent_id, prompt, http_client=http_client)
         if generation:
             generation.update(output=response)
             generation.update(usage={"ttfb": ttfb})
             generation.end()
-        responses[i] = (response, ttfb)
+        return response, ttfb
     except Exception as e:
         print(f"[ERROR] Agent {agent_id} failed: {e}")
         if generation:
             generation.update(output=f"[ERROR] {e}")
             generation.end()
-        responses[i] = ("[ERROR]", 0)
+        return "[ERROR]", 0
 
 
-def get_agent_responses(chat_ids, prompt, prompt_id="", prompt_subid="", prompt_span=None):
+async def get_agent_responses_async(chat_ids, prompt, prompt_id="", prompt_subid="", prompt_span=None):
     """
-    Dispatches the prompt to all agents in parallel and collects their responses.
+    Streams the prompt to all agents on one event loop and collects their responses in agent order.
     """
-    global responses, threads
-    responses = [None] * _NUM_AGENTS
-    threads = [None] * _NUM_AGENTS
-
     if _RANDOM:
         random.shuffle(chat_ids)
 
-    for i, agent_name in enumerate(_AGENTS.keys()):
-        threads[i] = threading.Thread(
-            target=get_agent_response,
-            args=(i, _AGENTS[agent_name], chat_ids[i], prompt, prompt_span, prompt_id, prompt_subid, agent_name)
-        )
-        threads[i].start()
+    async with httpx.AsyncClient(timeout=60) as http_client:
+        return await asyncio.gather(*[
+            get_agent_response_async(http_client, _AGENTS[agent_name], chat_ids[i], prompt,
+                                     prompt_span, prompt_id, prompt_subid, agent_name)
+            for i, agent_name in enumerate(_AGENTS.keys())
+        ])
 
-    for i in range(_NUM_AGENTS):
-        threads[i].join()
 
-    return responses
+def get_agent_responses(chat_ids, prompt, prompt_id="", prompt_subid="", prompt_span=None):
+    """
+    Dispatches the prompt to all agents in parallel and collects their responses.
+    """
+    return asyncio.run(get_agent_responses_async(chat_ids, prompt, prompt_id, prompt_subid, prompt_span))
 
 
 # Export these for use in run_sentient.py
-__all__ = ["get_agent_responses", "_AGENTS", "_NUM_AGENTS"]
+__all__ = ["get_agent_responses", "get_agent_responses_async", "_AGENTS", "_NUM_AGENTS"]
@@ -9,22 +9,91 @@ import sys
 import json
 import csv
 import time
-from typing import Dict, List, Any
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Dict, List, Any, Iterable, Iterator
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, RateLimitError
 except ImportError:
     print("❌ OpenAI not installed. Run: pip install openai")
     sys.exit(1)
 
+from batch_api import run_batch, record_content
+from rate_limit import RateLimiter
+
+# Questions graded per chat completion in evaluate_batch
+BATCH_SIZE = 16
+# Batches graded at once, paced by the shared RateLimiter
+MAX_WORKERS = 10
+# Above this many responses, grade through the OpenAI Batch API (half price, separate rate-limit pool)
+BATCH_API_THRESHOLD = 200
+
+def _format_expected(expected_answer: Any) -> str:
+    """Format an expected answer for the LLM"""
+    if isinstance(expected_answer, list):
+        return f"List: {expected_answer}"
+    elif isinstance(expected_answer, (int, float)):
+        return f"Number: {expected_answer}"
+    else:
+        return f"Text: {expected_answer}"
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield successive lists of up to size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 class SimpleLLMEvaluator:
-    def __init__(self, model="gpt-4o-mini"):
+    def __init__(self, model="gpt-4o-mini", rate_limiter=None):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.model = model
+        self.rate_limiter = rate_limiter
+    
+    def _create(self, prompt: str, max_tokens: int, max_retries: int = 3, **kwargs):
+        """Run one chat completion, paced by the rate limiter and retried on 429s"""
+        retry_delay = 2  # seconds
+        for attempt in range(max_retries):
+            if self.rate_limiter is not None:
+                # Rough estimate: ~4 characters per prompt token plus the completion budget
+                self.rate_limiter.acquire(len(prompt) // 4 + max_tokens)
+            try:
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.1,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+            except RateLimitError:
+                if attempt == max_retries - 1:
+                    raise
+                time.sleep(retry_delay)
+                retry_delay *= 2  # Exponential backoff
+    
+    def _error_evaluation(self, message: str, question: str, agent_response: str,
+                          expected_answer: Any, question_id: str) -> Dict[str, Any]:
+        """Evaluation record for a question whose LLM call failed"""
+        return {
+            "question_id": question_id,
+            "question": question,
+            "expected_answer": expected_answer,
+            "agent_response": agent_response,
+            "correctness": "Error",
+            "agent_answer": "Could not evaluate",
+            "expected_answer_text": str(expected_answer),
+            "issues": [f"LLM evaluation error: {message}"],
+            "quality_score": 0,
+            "raw_llm_response": f"Error: {message}"
+        }
         
     def evaluate_response(self, question: str, agent_response: str, expected_answer: Any, question_id: str) -> Dict[str, Any]:
         """
@@ -32,12 +101,7 @@ class SimpleLLMEvaluator:
         """
         
         # Format expected answer for LLM
-        if isinstance(expected_answer, list):
-            expected_str = f"List: {expected_answer}"
-        elif isinstance(expected_answer, (int, float)):
-            expected_str = f"Number: {expected_answer}"
-        else:
-            expected_str = f"Text: {expected_answer}"
+        expected_str = _format_expected(expected_answer)
         
         prompt = f"""
 Analyze this crypto agent response:
@@ -60,12 +124,7 @@ Be concise and clear.
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=500
-            )
+            response = self._create(prompt, max_tokens=500)
             
             content = response.choices[0].message.content
             
@@ -81,18 +140,127 @@ Be concise and clear.
             return evaluation
             
         except Exception as e:
-            return {
-                "question_id": question_id,
-                "question": question,
-                "expected_answer": expected_answer,
-                "agent_response": agent_response,
-                "correctness": "Error",
-                "agent_answer": "Could not evaluate",
-                "expected_answer_text": str(expected_answer),
-                "issues": [f"LLM evaluation error: {str(e)}"],
-                "quality_score": 0,
-                "raw_llm_response": f"Error: {str(e)}"
+            return self._error_evaluation(str(e), question, agent_response, expected_answer, question_id)
+    
+    def _batch_prompt(self, items: List[Dict[str, Any]]) -> str:
+        """Prompt asking for one JSON verdict per item"""
+        payload = [
+            {
+                "question_id": item["question_id"],
+                "question": item["question"],
+                "agent_response": item["agent_response"],
+                "expected_answer": _format_expected(item["expected_answer"])
             }
+            for item in items
+        ]
+        
+        return f"""
+Analyze each of these crypto agent responses:
+
+{json.dumps(payload, indent=1)}
+
+For every item, compare the agent response with the expected answer and reply with a JSON object:
+{{"results": [{{"question_id": "...", "correctness": "Yes/No/Partial", "agent_answer": "what they said", "expected_answer_text": "what they should have said", "issues": ["problems"], "quality_score": 1-10}}]}}
+
+Include exactly one result per question_id. Be concise and clear.
+"""
+    
+    def _batch_errors(self, message: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Error records for every item of a batch that could not be graded"""
+        return [
+            self._error_evaluation(message, item["question"], item["agent_response"],
+                                   item["expected_answer"], item["question_id"])
+            for item in items
+        ]
+    
+    def _batch_evaluations(self, items: List[Dict[str, Any]], content: str) -> List[Dict[str, Any]]:
+        """Turn the JSON reply to a batch prompt into evaluations, in the order of items"""
+        try:
+            results = {
+                result.get("question_id"): result
+                for result in json.loads(content).get("results", [])
+                if isinstance(result, dict)
+            }
+        except Exception as e:
+            return self._batch_errors(str(e), items)
+        
+        evaluations = []
+        for item in items:
+            result = results.get(item["question_id"])
+            if result is None:
+                evaluations.append(self._error_evaluation(
+                    "No result returned for this question", item["question"],
+                    item["agent_response"], item["expected_answer"], item["question_id"]
+                ))
+                continue
+            quality_score = result.get("quality_score", 0)
+            evaluations.append({
+                "correctness": str(result.get("correctness", "Unknown")),
+                "agent_answer": str(result.get("agent_answer", "Could not extract")),
+                "expected_answer_text": str(result.get("expected_answer_text", "Could not extract")),
+                "issues": result.get("issues") or [],
+                "quality_score": quality_score if isinstance(quality_score, (int, float)) else 0,
+                "raw_llm_response": json.dumps(result),
+                # Add metadata
+                "question_id": item["question_id"],
+                "question": item["question"],
+                "expected_answer": item["expected_answer"],
+                "agent_response": item["agent_response"]
+            })
+        return evaluations
+    
+    def evaluate_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Evaluate several agent responses in one chat completion
+        
+        Each item needs question_id, question, agent_response and expected_answer.
+        Results come back in the order of items.
+        """
+        prompt = self._batch_prompt(items)
+        try:
+            response = self._create(prompt, max_tokens=300 * len(items),
+                                    response_format={"type": "json_object"})
+            content = response.choices[0].message.content
+        except Exception as e:
+            return self._batch_errors(str(e), items)
+        return self._batch_evaluations(items, content)
+    
+    def evaluate_batches_offline(self, batches: List[List[Dict[str, Any]]], poll_interval: int = 30) -> List[Dict[str, Any]]:
+        """
+        Grade every batch through the OpenAI Batch API, one request line per batch
+        
+        Blocks until the batch job finishes; results come back in the order of the items.
+        """
+        try:
+            records = run_batch(
+                self.client,
+                [
+                    {
+                        "custom_id": f"batch-{i}",
+                        "body": {
+                            "model": self.model,
+                            "messages": [{"role": "user", "content": self._batch_prompt(items)}],
+                            "temperature": 0.1,
+                            "max_tokens": 300 * len(items),
+                            "response_format": {"type": "json_object"}
+                        }
+                    }
+                    for i, items in enumerate(batches)
+                ],
+                "simple_llm_evaluation_batch.jsonl",
+                poll_interval=poll_interval
+            )
+        except Exception as e:
+            return [evaluation for items in batches for evaluation in self._batch_errors(str(e), items)]
+        
+        evaluations = []
+        for i, items in enumerate(batches):
+            content, error = record_content(records.get(f"batch-{i}"))
+            if content is None:
+                evaluations.extend(self._batch_errors(error, items))
+                continue
+            evaluations.extend(self._batch_evaluations(items, content))
+        return evaluations
     
     def _parse_llm_response(self, content: str) -> Dict[str, Any]:
         """Parse LLM response into structured format"""
@@ -179,58 +347,73 @@ def run_simple_llm_evaluation():
     agent_responses = load_agent_responses("test/sentient_responses.csv")
     
     # Initialize evaluator
-    evaluator = SimpleLLMEvaluator()
+    evaluator = SimpleLLMEvaluator(rate_limiter=RateLimiter())
     
-    # Evaluate each response
-    evaluations = []
-    correct_count = 0
+    # Evaluate the responses BATCH_SIZE at a time, one chat completion per batch
+    items = [
+        {
+            "question_id": question_id,
+            "question": queries[question_id]['question'],
+            "agent_response": response,
+            "expected_answer": queries[question_id]['expected_answer']
+        }
+        for question_id, response in agent_responses.items()
+        if question_id in queries
+    ]
+    
+    # Grade the batches concurrently; results are keyed by question_id and re-ordered afterwards
+    results = {}
     total_count = 0
     
+    # Summary aggregates are accumulated in the same pass that writes the results
+    correct_count = 0
+    correctness_counts = Counter()
+    quality_sum = 0.0
+    quality_n = 0
+    
     print(f"🔄 Evaluating {len(agent_responses)} responses...")
     
-    for question_id, response in agent_responses.items():
-        if question_id in queries:
-            question_data = queries[question_id]
-            
-            print(f"\n[{total_count + 1:2d}/{len(agent_responses)}] Evaluating: {question_id}")
-            print(f"Question: {question_data['question'][:60]}...")
-            
-            # Run LLM evaluation
-            evaluation = evaluator.evaluate_response(
-                question=question_data['question'],
-                agent_response=response,
-                expected_answer=question_data['expected_answer'],
-                question_id=question_id
-            )
-            
-            evaluations.append(evaluation)
-            
-            # Track statistics
+    # Write each result as it is reported so a crash mid-run keeps what was already graded
+    csv_fields = ['question_id', 'correctness', 'quality_score', 'agent_answer', 'expected_answer_text', 'issues']
+    with open("test/simple_llm_evaluation_results.jsonl", "w", encoding='utf-8') as jsonl_file, \
+         open("test/simple_llm_evaluation_results.csv", "w", newline='', encoding='utf-8') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=csv_fields)
+        writer.writeheader()
+        
+        def report(evaluation):
+            nonlocal total_count, correct_count, quality_sum, quality_n
+            results[evaluation['question_id']] = evaluation
             total_count += 1
-            if evaluation['correctness'].lower() == 'yes':
+            correctness = evaluation['correctness'].lower()
+            correctness_counts[correctness] += 1
+            if correctness == 'yes':
                 correct_count += 1
+            if isinstance(evaluation['quality_score'], (int, float)):
+                quality_sum += evaluation['quality_score']
+                quality_n += 1
             
+            print(f"\n[{total_count:2d}/{len(agent_responses)}] {evaluation['question_id']}")
             print(f"   Result: {evaluation['correctness']}")
             print(f"   Quality: {evaluation['quality_score']}/10")
             print(f"   Agent said: {evaluation['agent_answer'][:50]}...")
             
-            # Add delay to avoid rate limits
-            time.sleep(0.5)
-    
-    # Save detailed results
-    print("\n💾 Saving evaluation results...")
+            jsonl_file.write(json.dumps(evaluation) + "\n")
+            writer.writerow({k: evaluation.get(k, '') for k in csv_fields})
+            jsonl_file.flush()
+            csv_file.flush()
+        
+        if len(items) > BATCH_API_THRESHOLD:
+            # Large runs are not interactive: trade latency for the Batch API's lower price
+            for evaluation in evaluator.evaluate_batches_offline(list(_chunked(items, BATCH_SIZE))):
+                report(evaluation)
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = [executor.submit(evaluator.evaluate_batch, batch) for batch in _chunked(items, BATCH_SIZE)]
+                for future in as_completed(futures):
+                    for evaluation in future.result():
+                        report(evaluation)
     
-    # Save as JSON
-    with open("test/simple_llm_evaluation_results.json", "w") as f:
-        json.dump(evaluations, f, indent=2)
-    
-    # Save as CSV
-    csv_fields = ['question_id', 'correctness', 'quality_score', 'agent_answer', 'expected_answer_text', 'issues']
-    with open("test/simple_llm_evaluation_results.csv", "w", newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=csv_fields)
-        writer.writeheader()
-        for eval in evaluations:
-            writer.writerow({k: eval.get(k, '') for k in csv_fields})
+    evaluations = [results[item['question_id']] for item in items]
     
     # Print summary
     print("\n" + "=" * 60)
@@ -239,23 +422,17 @@ def run_simple_llm_evaluation():
     print(f"✅ Correct Answers: {correct_count}/{total_count} ({correct_count/total_count*100:.1f}%)")
     
     # Breakdown by correctness
-    correctness_counts = {}
-    for eval in evaluations:
-        correctness = eval['correctness'].lower()
-        correctness_counts[correctness] = correctness_counts.get(correctness, 0) + 1
-    
     print("\n📈 Breakdown by Correctness:")
     for correctness, count in correctness_counts.items():
         print(f"   {correctness.title()}: {count} ({count/total_count*100:.1f}%)")
     
     # Average quality score
-    quality_scores = [eval['quality_score'] for eval in evaluations if isinstance(eval['quality_score'], (int, float))]
-    if quality_scores:
-        avg_quality = sum(quality_scores) / len(quality_scores)
+    if quality_n:
+        avg_quality = quality_sum / quality_n
         print(f"\n📊 Average Quality Score: {avg_quality:.1f}/10")
     
     print(f"\n📄 Results saved to:")
-    print(f"   - test/simple_llm_evaluation_results.json")
+    print(f"   - test/simple_llm_evaluation_results.jsonl")
     print(f"   - test/simple_llm_evaluation_results.csv")
     
     return evaluations
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import time
@@ -101,4 +102,85 @@ def get_response(chat_id: str, agent_id: str, user_query: str, generation=None):
         return answer, time_to_first_token
 
 
+async def get_response_async(chat_id: str, agent_id: str, user_query: str, generation=None, http_client=None):
+    """Async variant of get_response; pass a shared httpx.AsyncClient to multiplex agents on one loop"""
+    url = f"{_AGENTS_URL}/{agent_id}"
+    own_client = http_client is None
+    if own_client:
+        http_client = httpx.AsyncClient(timeout=60)
+    # Ensure request_id is greater than chat_id
+    await asyncio.sleep(0.01)
+    request_id = str(ULID())
+    while request_id <= chat_id:
+        await asyncio.sleep(0.01)
+        request_id = str(ULID())
+    headers = {
+        "Authorization": f"Bearer {_AUTH_TOKEN}",
+        "Accept": "text/event-stream",
+        "x-custom-auth": _CUSTOM_AUTH,
+        "x-user-id": _TEST_EMAIL
+    }
+    payload = {
+        "id": request_id,
+        "chat_id": chat_id,
+        "content": {
+            "capability": "assist",
+            "request_payload": {
+                "parts": [
+                    {
+                        "prompt": user_query,
+                        "files_ids": []
+                    }
+                ]
+            }
+        }
+    }
+    answer = ""
+    first_token_time = None
+    start_time = time.time()
+    try:
+        async with http_client.stream("POST", url, headers=headers, json=payload) as response:
+            if response.status_code == 200:
+                # Minimal SSE framing: "data:" lines accumulate until a blank line ends the event
+                data_lines = []
 
+                def dispatch():
+                    nonlocal answer, first_token_time
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    try:
+                        data = json.loads("\n".join(data_lines))
+                        event_name = data.get("event_name", "unknown")
+                        if event_name == "final_response" and "content" in data:
+                            answer += data["content"]
+                    except Exception:
+                        pass
+                    data_lines.clear()
+
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].lstrip(" "))
+                    elif not line and data_lines:
+                        dispatch()
+                if data_lines:
+                    dispatch()
+                # Agents stream concurrently here, so print each answer once it is complete, labelled by agent
+                print(f"[{agent_id}] {answer}")
+            else:
+                raw_content = await response.aread()
+                try:
+                    print(f"[ERROR] Agent response: {raw_content.decode('utf-8')}")
+                except Exception:
+                    print(f"[ERROR] Agent response (raw bytes): {raw_content}")
+    finally:
+        if own_client:
+            await http_client.aclose()
+    time_to_first_token = None
+    if first_token_time is not None:
+        time_to_first_token = (first_token_time - start_time) * 1000
+    if generation is not None:
+        generation.end(
+            output=answer,
+            usage={"ttfb": time_to_first_token}
+        )
+    return answer, time_to_first_token